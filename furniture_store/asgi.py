@@ -13,4 +13,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'furniture_store.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up; streams order events (server-sent events)
+from shop.events import EVENTS_PATH, order_events_app  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+        return await order_events_app(scope, receive, send)
+    return await django_application(scope, receive, send)
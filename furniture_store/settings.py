@@ -43,6 +43,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'shop.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -133,6 +134,39 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploads are stored under their content hash, so media URLs never change
+# content and can be cached forever by browsers, CDNs and the web server.
+DEFAULT_FILE_STORAGE = 'shop.storage.ContentAddressedStorage'
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+
+# Production runs several workers, so CACHE_BACKEND must be a shared backend
+# such as django.core.cache.backends.memcached.PyMemcacheCache (with
+# CACHE_LOCATION set to the server address); the per-process default only
+# suits a single development server.
+# `manage.py check --deploy` warns about process-local backends.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+
+# Workers keep categories in memory and re-check a version key in the cache
+# this often (seconds). Invalidation only reaches other workers when CACHES
+# uses a shared backend such as Redis or Memcached.
+CATEGORY_SNAPSHOT_CHECK_INTERVAL = 1.0
+
+# Product views are buffered per worker and written by a background thread
+# this often (seconds) or once this many are pending; a crash loses at most
+# one buffer.
+# Trending scores halve every PRODUCT_POPULARITY_HALF_LIFE_HOURS.
+PRODUCT_VIEWS_FLUSH_INTERVAL = 30
+PRODUCT_VIEWS_MAX_PENDING = 1000
+PRODUCT_POPULARITY_HALF_LIFE_HOURS = 24 * 7
+
+# On-demand request profiles (X-Profile header or ?profile=1 for staff)
+PROFILE_DIR = BASE_DIR / 'profiles'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
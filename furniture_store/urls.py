@@ -24,6 +24,7 @@ from rest_framework_simplejwt.views import (
 from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
+from shop.views import serve_media
 
 # Swagger/OpenAPI Schema
 schema_view = get_schema_view(
@@ -55,7 +56,7 @@ urlpatterns = [
 
 # static and Media files
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += static(settings.MEDIA_URL, view=serve_media, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
 
@@ -1,26 +1,130 @@
+import copy
+
 from django.contrib import admin
-from .models import Category, Product, Customer, Order, OrderItem, Review
+from django.core.cache import cache
+from django.contrib.admin.views.main import ChangeList
+from django.db.models import Count
+
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, Category, Product, Customer, Order, OrderItem,
+    OrderStatusHistory, Review,
+)
+from .pagination import EstimatedCountPaginator
+from . import autocomplete, events, leaderboard, recommendations
+
+
+class CachedFacetListFilter(admin.SimpleListFilter):
+    """List filter whose choices are cached instead of scanned on every page load"""
+    field_name = None
+    cache_timeout = 60 * 10
+    max_choices = 200
+
+    def lookups(self, request, model_admin):
+        model = model_admin.model
+        key = f'admin-facets:{model._meta.label_lower}:{self.field_name}'
+        values = cache.get(key)
+
+        if values is None:
+            values = list(
+                model._default_manager.exclude(**{self.field_name: ''})
+                .order_by(self.field_name)
+                .values_list(self.field_name, flat=True)
+                .distinct()[:self.max_choices]
+            )
+            cache.set(key, values, self.cache_timeout)
+
+        return [(value, value) for value in values]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.field_name: self.value()})
+        return queryset
+
+
+def cached_facet_filter(field_name, title=None):
+    """Build a CachedFacetListFilter for a plain char field"""
+    return type(f'{field_name.title()}FacetFilter', (CachedFacetListFilter,), {
+        'title': title or field_name,
+        'parameter_name': field_name,
+        'field_name': field_name,
+    })
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist defaults for tables with millions of rows"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class IndexedSearchMixin:
+    """Admin search answering indexed fields from the autocomplete index.
+
+    search_index names the autocomplete kind, search_index_field the column
+    holding its object ids and indexed_search_fields the search_fields it
+    covers. The index matches word prefixes only, so when it finds nothing
+    (say "mit" for "Smith") or more than indexed_search_max_ids objects, the
+    default icontains search runs instead. Search fields the index does not
+    cover are always searched the default way.
+    """
+    search_index = None
+    search_index_field = 'pk'
+    indexed_search_fields = ()
+    indexed_search_max_ids = 1000
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+
+        ids = autocomplete.prefix_ids(self.search_index, search_term, limit=self.indexed_search_max_ids + 1)
+        if not ids or len(ids) > self.indexed_search_max_ids:
+            return super().get_search_results(request, queryset, search_term)
+        matched = queryset.filter(**{f'{self.search_index_field}__in': ids})
+
+        unindexed = [
+            field for field in self.get_search_fields(request)
+            if field not in self.indexed_search_fields
+        ]
+        if not unindexed:
+            return matched, False
+        # Default search over the remaining fields only, on a copy so the
+        # changelist keeps its full search_fields
+        fallback = copy.copy(self)
+        fallback.search_fields = unindexed
+        others, may_have_duplicates = super(IndexedSearchMixin, fallback).get_search_results(
+            request, queryset, search_term
+        )
+        return matched | others, may_have_duplicates
+
 
 # Register your models here.
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    lst_display = ['name', 'created_at', 'products_count']
+    list_display = ['name', 'created_at', 'products_count']
     search_fields = ['name', 'description']
     list_filter = ['created_at']
     ordering = ['name']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(_products_count=Count('products'))
+
     def products_count(self, obj):
-        return obj.products.count()
+        return obj._products_count
     products_count.short_description = 'Products'
+    products_count.admin_order_field = '_products_count'
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeTableAdmin):
     list_display = [
         'name', 'category', 'price', 'stock',
         'material', 'color', 'is_featured', 'created_at'
     ]
-    list_filter = ['category', 'is_featured', 'material', 'color', 'created_at']
+    list_filter = [
+        'category', 'is_featured', cached_facet_filter('material'),
+        cached_facet_filter('color'), 'created_at'
+    ]
+    list_select_related = ['category']
+    autocomplete_fields = ['category']
     search_fields = ['name', 'description', 'material', 'color']
     list_editable = ['price', 'stock', 'is_featured']
     ordering = ['-created_at']
@@ -38,27 +142,96 @@ class ProductAdmin(admin.ModelAdmin):
     )
 
 @admin.register(Customer)
-class CustomerAdmin(admin.ModelAdmin):
+class CustomerAdmin(IndexedSearchMixin, LargeTableAdmin):
     list_display = ['full_name', 'email', 'phone', 'city', 'country', 'created_at']
     search_fields = ['full_name', 'email', 'phone', 'city', 'country']
-    list_filter = ['country', 'city', 'created_at']
+    search_index = 'customer'
+    indexed_search_fields = ['full_name', 'email', 'phone']
+    list_filter = [cached_facet_filter('country'), cached_facet_filter('city'), 'created_at']
     ordering = ['-created_at']
 
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    fields = ['id', 'product', 'quantity', 'subtotal']
+    readonly_fields = fields
+    can_delete = False
+    extra = 0
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(IndexedSearchMixin, LargeTableAdmin):
+    """Read-only view of orders moved out of the live tables"""
+    list_display = ['id', 'customer', 'total_price', 'status', 'created_at', 'archived_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['customer__full_name', 'customer__email']
+    search_index = 'customer'
+    search_index_field = 'customer_id'
+    indexed_search_fields = search_fields
+    list_select_related = ['customer']
+    ordering = ['-created_at']
+    inlines = [ArchivedOrderItemInline]
+    readonly_fields = [
+        'id', 'customer', 'total_price', 'status', 'created_at', 'updated_at', 'notes', 'archived_at'
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def delete_model(self, request, obj):
+        if obj.status != 'cancelled':
+            leaderboard.record_orders([obj.id], sign=-1, archived=True)
+            recommendations.record_orders([obj.id], sign=-1, archived=True)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        counted = list(queryset.exclude(status='cancelled').values_list('id', flat=True))
+        leaderboard.record_orders(counted, sign=-1, archived=True)
+        recommendations.record_orders(counted, sign=-1, archived=True)
+        super().delete_queryset(request, queryset)
+
+
+class OrderChangeList(ChangeList):
+    """Counts the items of the orders on the current page with one grouped query"""
+
+    def get_results(self, request):
+        super().get_results(request)
+        orders = list(self.result_list)
+        counts = dict(
+            OrderItem.objects.filter(order_id__in=[order.pk for order in orders])
+            .order_by().values_list('order_id').annotate(count=Count('pk'))
+        )
+        for order in orders:
+            order._items_count = counts.get(order.pk, 0)
+
+
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 1
     readonly_fields = ['subtotal']
     fields = ['product','quantity', 'subtotal']
+    autocomplete_fields = ['product']
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(IndexedSearchMixin, LargeTableAdmin):
     list_display = [
         'id', 'customer', 'total_price', 'status',
         'items_count', 'created_at'
     ]
     list_filter = ['status', 'created_at']
     search_fields = ['customer__full_name', 'customer__email']
+    search_index = 'customer'
+    search_index_field = 'customer_id'
+    indexed_search_fields = search_fields
+    list_select_related = ['customer']
+    autocomplete_fields = ['customer']
     list_editable = ['status']
     ordering = ['-created_at']
     inlines = [OrderItemInline]
@@ -77,28 +250,65 @@ class OrderAdmin(admin.ModelAdmin):
     )
     readonly_fields = ['created_at', 'updated_at']
 
+    def get_changelist(self, request, **kwargs):
+        return OrderChangeList
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and 'status' in form.changed_data:
+            OrderStatusHistory.objects.create(
+                order=obj, from_status=form.initial['status'],
+                to_status=obj.status, changed_by=request.user
+            )
+            leaderboard.status_changed([obj.id], form.initial['status'], obj.status)
+            recommendations.status_changed([obj.id], form.initial['status'], obj.status)
+            events.status_changed(obj.id, obj.customer_id, form.initial['status'], obj.status)
+
+    def delete_model(self, request, obj):
+        if obj.status != 'cancelled':
+            leaderboard.record_orders([obj.id], sign=-1)
+            recommendations.record_orders([obj.id], sign=-1)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        counted = list(queryset.exclude(status='cancelled').values_list('id', flat=True))
+        leaderboard.record_orders(counted, sign=-1)
+        recommendations.record_orders(counted, sign=-1)
+        super().delete_queryset(request, queryset)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if not change:
+            if form.instance.status != 'cancelled':
+                leaderboard.record_orders([form.instance.id])
+                recommendations.record_orders([form.instance.id])
+            events.order_created(form.instance)
+
     def items_count(self, obj):
-        try:
-            return obj.items.count()
-        except Exception:
-            return 0
+        # Filled in per page by OrderChangeList, so the column cannot be sorted on
+        return getattr(obj, '_items_count', 0)
     items_count.short_description = 'Items'
 
 
 @admin.register(OrderItem)
-class OrderItemAdmin(admin.ModelAdmin):
+class OrderItemAdmin(LargeTableAdmin):
     list_display = ['order', 'product', 'quantity', 'subtotal']
     list_filter = ['order__status', 'order__created_at']
     search_fields = ['product__name', 'order__customer__full_name']
     readonly_fields = ['subtotal']
+    list_select_related = ['order__customer', 'product']
+    raw_id_fields = ['order']
+    autocomplete_fields = ['product']
 
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(LargeTableAdmin):
     list_display = ['product', 'customer', 'rating', 'created_at']
     list_filter = ['rating', 'created_at']
     search_fields = ['product__name', 'customer__full_name', 'comment']
     ordering = ['-created_at']
+    list_select_related = ['product', 'customer']
+    autocomplete_fields = ['product', 'customer']
 
     fieldsets =(
         ('Review Information', {
@@ -0,0 +1,140 @@
+"""Hot/cold storage for orders.
+
+Delivered and cancelled orders older than ARCHIVE_AFTER are moved, with their
+items, from Order/OrderItem into ArchivedOrder/ArchivedOrderItem under the same
+ids, so the live tables and their indexes only hold the working set. Each
+batch is copied first and deleted second, and the copy ignores rows that
+already exist, so an interrupted run is finished by simply running it again.
+
+Code that needs the full history reads through Order.history.tiered(), which
+returns a TieredOrderSet merging both tiers newest first.
+"""
+import heapq
+from datetime import timedelta
+from itertools import chain, islice
+
+from django.conf import settings
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+ARCHIVE_AFTER = timedelta(days=getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 365))
+ARCHIVABLE_STATUSES = ['delivered', 'cancelled']
+
+ORDER_FIELDS = ['id', 'customer_id', 'total_price', 'status', 'created_at', 'updated_at', 'notes']
+ITEM_FIELDS = ['id', 'order_id', 'product_id', 'quantity', 'subtotal']
+
+
+def _newest_first(order):
+    return order.created_at, order.id
+
+
+class TieredOrderSet:
+    """Read-only, queryset-like view over live and archived orders.
+
+    Supports count(), len(), iteration and slicing, which is everything
+    Django's Paginator needs. A slice fetches at most ``stop`` rows from each
+    tier and merges them by (created_at, id) descending, so deep offsets get
+    slower; page() seeks to a (created_at, id) position instead and costs the
+    same at any depth.
+    """
+    ordered = True
+
+    def __init__(self, filters=None):
+        self.filters = filters or {}
+        self._count = None
+
+    def _tiers(self):
+        return [
+            model.objects.filter(**self.filters)
+            .select_related('customer')
+            .prefetch_related('items__product')
+            .order_by('-created_at', '-id')
+            for model in (Order, ArchivedOrder)
+        ]
+
+    def count(self):
+        if self._count is None:
+            self._count = sum(tier.count() for tier in self._tiers())
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return heapq.merge(*self._tiers(), key=_newest_first, reverse=True)
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self[key:key + 1][0]
+        start, stop = key.start or 0, key.stop
+        tiers = self._tiers() if stop is None else [tier[:stop] for tier in self._tiers()]
+        return list(islice(heapq.merge(*tiers, key=_newest_first, reverse=True), start, stop))
+
+    def page(self, limit, before=None):
+        """Up to limit orders after the (created_at, id) position before, newest first"""
+        tiers = self._tiers()
+        if before is not None:
+            created_at, order_id = before
+            older = Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id)
+            tiers = [tier.filter(older) for tier in tiers]
+        merged = heapq.merge(*[tier[:limit] for tier in tiers], key=_newest_first, reverse=True)
+        return list(islice(merged, limit))
+
+    def sum(self, field):
+        return sum(
+            tier.aggregate(total=Sum(field))['total'] or 0
+            for tier in (Order.objects.filter(**self.filters), ArchivedOrder.objects.filter(**self.filters))
+        )
+
+
+def order_items(*fields, exclude_cancelled=True):
+    """Iterate values_list rows of OrderItem and ArchivedOrderItem, ordered by order id per tier"""
+    querysets = []
+    for model in (OrderItem, ArchivedOrderItem):
+        queryset = model.objects.all()
+        if exclude_cancelled:
+            queryset = queryset.exclude(order__status='cancelled')
+        querysets.append(queryset.order_by('order_id').values_list(*fields).iterator())
+    return chain(*querysets)
+
+
+def archivable_orders(cutoff=None):
+    cutoff = cutoff or timezone.now() - ARCHIVE_AFTER
+    return Order.objects.filter(status__in=ARCHIVABLE_STATUSES, created_at__lt=cutoff)
+
+
+def archive_batch(order_ids):
+    """Copy the given orders and their items to the archive, then delete them"""
+    orders = [
+        ArchivedOrder(**row)
+        for row in Order.objects.filter(pk__in=order_ids).values(*ORDER_FIELDS)
+    ]
+    items = [
+        ArchivedOrderItem(**row)
+        for row in OrderItem.objects.filter(order_id__in=order_ids).values(*ITEM_FIELDS)
+    ]
+    ArchivedOrder.objects.bulk_create(orders, ignore_conflicts=True)
+    ArchivedOrderItem.objects.bulk_create(items, ignore_conflicts=True)
+
+    # Only delete what is now known to be in the archive
+    archived = set(ArchivedOrder.objects.filter(pk__in=order_ids).values_list('id', flat=True))
+    OrderItem.objects.filter(order_id__in=archived).delete()
+    Order.objects.filter(pk__in=archived).delete()
+    return len(archived), len(items)
+
+
+def archive(cutoff=None, batch_size=500, limit=None):
+    """Archive eligible orders in batches, yielding (orders, items) per batch"""
+    done = 0
+    while limit is None or done < limit:
+        size = batch_size if limit is None else min(batch_size, limit - done)
+        ids = list(archivable_orders(cutoff).order_by('id').values_list('id', flat=True)[:size])
+        if not ids:
+            return
+        orders, items = archive_batch(ids)
+        if not orders:
+            raise RuntimeError(f'Could not archive any of orders {ids[0]}..{ids[-1]}')
+        done += orders
+        yield orders, items
@@ -0,0 +1,173 @@
+"""Prefix and trigram autocomplete over customers and products.
+
+Every indexed object gets AutocompleteTerm rows (normalized prefix keys: the
+whole value plus each word, the local part of emails and every suffix of
+the digits of phone numbers, so a number is found without its country or
+area code) and AutocompleteTrigram rows. A lookup is an indexed prefix range
+scan plus a trigram-overlap count, merged and capped in Python, instead of an
+icontains scan across every row.
+"""
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import AutocompleteTerm, AutocompleteTrigram, Customer, Product
+
+INDEXES = {
+    'customer': (Customer, ['full_name', 'email', 'phone'], ['id', 'full_name', 'email', 'phone']),
+    'product': (Product, ['name'], ['id', 'name', 'price']),
+}
+MAX_LIMIT = 20
+MIN_SIMILARITY = 0.3
+
+
+def normalize(value):
+    """Lowercase, strip accents and collapse whitespace"""
+    value = unicodedata.normalize('NFKD', str(value or ''))
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return ' '.join(value.lower().split())
+
+
+def trigrams(value):
+    padded = f'  {normalize(value)} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def keys_for(field, value):
+    """Prefix keys under which an object should be found for one field"""
+    value = normalize(value)
+    if not value:
+        return set()
+    if field == 'phone':
+        digits = re.sub(r'\D', '', value)
+        return {digits[start:] for start in range(len(digits))}
+
+    keys = {value}
+    if field == 'email':
+        keys.add(value.split('@')[0])
+    keys.update(word for word in re.split(r'[\s.\-_@]+', value) if word)
+    return {key[:255] for key in keys}
+
+
+def _rows(kind, obj):
+    model, fields, _ = INDEXES[kind]
+    terms = []
+    grams = set()
+    for field in fields:
+        value = getattr(obj, field)
+        terms.extend(
+            AutocompleteTerm(kind=kind, object_id=obj.pk, field=field, key=key)
+            for key in keys_for(field, value)
+        )
+        if field != 'phone':
+            grams |= trigrams(value)
+    return terms, [AutocompleteTrigram(kind=kind, object_id=obj.pk, trigram=gram) for gram in grams]
+
+
+def index_object(kind, obj):
+    terms, grams = _rows(kind, obj)
+    with transaction.atomic():
+        remove_object(kind, obj.pk)
+        AutocompleteTerm.objects.bulk_create(terms)
+        AutocompleteTrigram.objects.bulk_create(grams)
+
+
+def index_new_objects(kind, objects, batch_size=1000):
+    """Index objects that were bulk-created and so never sent post_save"""
+    terms = []
+    grams = []
+    for obj in objects:
+        object_terms, object_grams = _rows(kind, obj)
+        terms.extend(object_terms)
+        grams.extend(object_grams)
+    AutocompleteTerm.objects.bulk_create(terms, batch_size=batch_size)
+    AutocompleteTrigram.objects.bulk_create(grams, batch_size=batch_size)
+
+
+def remove_object(kind, object_id):
+    AutocompleteTerm.objects.filter(kind=kind, object_id=object_id).delete()
+    AutocompleteTrigram.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def rebuild(kind, batch_size=1000):
+    model, fields, _ = INDEXES[kind]
+    terms = []
+    grams = []
+    with transaction.atomic():
+        AutocompleteTerm.objects.filter(kind=kind).delete()
+        AutocompleteTrigram.objects.filter(kind=kind).delete()
+
+        for obj in model.objects.only('pk', *fields).iterator():
+            object_terms, object_grams = _rows(kind, obj)
+            terms.extend(object_terms)
+            grams.extend(object_grams)
+            if len(grams) >= batch_size:
+                AutocompleteTerm.objects.bulk_create(terms, batch_size=batch_size)
+                AutocompleteTrigram.objects.bulk_create(grams, batch_size=batch_size)
+                terms, grams = [], []
+
+        AutocompleteTerm.objects.bulk_create(terms, batch_size=batch_size)
+        AutocompleteTrigram.objects.bulk_create(grams, batch_size=batch_size)
+
+
+def _prefixes(query):
+    phone_query = re.sub(r'[\s\-+().]', '', query)
+    return {query, phone_query} if phone_query.isdigit() else {query}
+
+
+def prefix_ids(kind, query, limit):
+    """Up to limit distinct ids of objects with a key starting with query"""
+    query = normalize(query)
+    if not query:
+        return []
+    ids = []
+    for prefix in _prefixes(query):
+        ids.extend(
+            AutocompleteTerm.objects.filter(kind=kind, key__startswith=prefix)
+            .order_by('object_id').values_list('object_id', flat=True).distinct()[:limit]
+        )
+    return sorted(set(ids))[:limit]
+
+
+def matching_ids(kind, query, limit=8):
+    """Return object ids matching query, best first.
+
+    Prefix matches rank above trigram matches, and exact key matches rank
+    above other prefix matches.
+    """
+    query = normalize(query)
+    if not query:
+        return []
+
+    scores = {}
+    for prefix in _prefixes(query):
+        # Keys sort after their own prefixes, so exact and closest keys come first
+        for object_id, key in AutocompleteTerm.objects.filter(
+            kind=kind, key__startswith=prefix
+        ).order_by('key').values_list('object_id', 'key')[:limit * 5]:
+            score = 3 if key == prefix else 2
+            scores[object_id] = max(scores.get(object_id, 0), score)
+
+    grams = trigrams(query)
+    if len(query) >= 3 and len(scores) < limit:
+        for object_id, shared in (
+            AutocompleteTrigram.objects.filter(kind=kind, trigram__in=grams)
+            .values('object_id').annotate(shared=Count('id'))
+            .order_by('-shared').values_list('object_id', 'shared')[:limit * 5]
+        ):
+            similarity = shared / len(grams)
+            if similarity >= MIN_SIMILARITY:
+                scores[object_id] = max(scores.get(object_id, 0), similarity)
+
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return [object_id for object_id, _ in ranked[:limit]]
+
+
+def suggest(kind, query, limit=8):
+    """Return lightweight dicts for the best matches of query"""
+    model, _, columns = INDEXES[kind]
+    ids = matching_ids(kind, query, min(limit, MAX_LIMIT))
+    rows = {row['id']: row for row in model.objects.filter(pk__in=ids).values(*columns)}
+    return [rows[pk] for pk in ids if pk in rows]
@@ -0,0 +1,103 @@
+"""Process-local snapshot of all categories and their product counts.
+
+Categories are few and rarely change, so each worker keeps the whole table in
+memory and serializers and filters resolve categories from it instead of
+joining. Saving or deleting a Category, and creating, deleting or moving a
+Product to another category, bumps a version number in the shared cache; a
+worker compares its snapshot's version with the shared one at most every
+CHECK_INTERVAL seconds and rebuilds when they differ. Code that writes these
+rows with queryset update() must call invalidate() itself. The cross-worker
+part relies on CACHES pointing at a shared backend, which
+`manage.py check --deploy` verifies.
+"""
+import threading
+import time
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Category
+
+VERSION_KEY = 'catalog:categories:version'
+CHECK_INTERVAL = getattr(settings, 'CATEGORY_SNAPSHOT_CHECK_INTERVAL', 1.0)
+
+
+class CategorySnapshot:
+    """Immutable view of the categories table at one version.
+
+    The Category instances it holds are shared between threads and must be
+    treated as read-only.
+    """
+    __slots__ = ('version', 'categories', 'by_id')
+
+    def __init__(self, version, categories):
+        self.version = version
+        self.categories = tuple(categories)
+        self.by_id = MappingProxyType({category.id: category for category in self.categories})
+
+    def get(self, category_id):
+        return self.by_id.get(category_id)
+
+    def ids_matching(self, text):
+        """Ids of categories whose name contains text, case-insensitively"""
+        text = text.casefold()
+        return [category.id for category in self.categories if text in category.name.casefold()]
+
+
+_lock = threading.Lock()
+_snapshot = None
+_checked_at = 0.0
+
+
+def _shared_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def snapshot():
+    """Return the current snapshot, rebuilding it if another worker changed categories"""
+    global _snapshot, _checked_at
+
+    current = _snapshot
+    now = time.monotonic()
+    if current is not None and now - _checked_at < CHECK_INTERVAL:
+        return current
+
+    version = _shared_version()
+    if current is not None and current.version == version:
+        _checked_at = now
+        return current
+
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            # The version is read before the rows, so a concurrent change is
+            # picked up on the next check rather than lost
+            categories = Category.objects.annotate(_products_count=Count('products')).order_by('name')
+            _snapshot = CategorySnapshot(version, categories)
+        _checked_at = now
+        return _snapshot
+
+
+def get_category(category_id):
+    return snapshot().get(category_id)
+
+
+def invalidate():
+    """Mark every worker's snapshot stale once the current transaction commits"""
+    transaction.on_commit(_bump_version)
+
+
+def _bump_version():
+    global _snapshot
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Key evicted; any value no worker has seen yet will do
+        cache.set(VERSION_KEY, int(time.time() * 1000), None)
+    _snapshot = None
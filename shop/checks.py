@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Backends whose entries live in one process and never reach other workers
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """The category snapshot version has to live in a cache every worker shares"""
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend in PROCESS_LOCAL_CACHES:
+        return [Warning(
+            f'The default cache ({backend}) is local to each process, so category '
+            'changes will not invalidate the snapshots held by other workers.',
+            hint='Set CACHE_BACKEND to a shared backend such as memcached or Redis.',
+            id='shop.W001',
+        )]
+    return []
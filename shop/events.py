@@ -0,0 +1,219 @@
+"""Server-sent events for order creation and status changes.
+
+Writers call order_created()/status_changed(); once the transaction commits
+the event goes to the configured backend, which hands it to every process's
+Hub. The Hub fans it out in-process to the open SSE connections allowed to
+see it: staff see every order, customers only their own.
+
+ORDER_EVENTS_BACKEND names the backend class. LocalBackend delivers straight
+to the Hub of the current process, which is all a single ASGI worker needs;
+a cross-process backend (Redis pub/sub, Postgres LISTEN/NOTIFY, ...) publishes
+to its broker and calls the dispatch callback from its listener.
+
+The stream itself is the plain ASGI app order_events_app, mounted in
+furniture_store/asgi.py because Django 3.2 cannot stream async responses.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .models import Customer
+
+EVENTS_PATH = '/api/events/orders/'
+HEARTBEAT_SECONDS = getattr(settings, 'ORDER_EVENTS_HEARTBEAT', 15)
+QUEUE_SIZE = 100
+
+
+class Subscriber:
+    def __init__(self, loop, customer_id=None, is_staff=False, order_id=None):
+        self.loop = loop
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.customer_id = customer_id
+        self.is_staff = is_staff
+        self.order_id = order_id
+        self.overflowed = False
+
+    def wants(self, event):
+        if self.order_id is not None and event['order_id'] != self.order_id:
+            return False
+        return self.is_staff or event['customer_id'] == self.customer_id
+
+    def offer(self, event):
+        # Runs on the subscriber's loop; a client that stops reading is dropped
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class Hub:
+    """In-process registry of open streams"""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+
+    def subscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.add(subscriber)
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def dispatch(self, event):
+        event = {**event, 'id': next(self.ids)}
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            if subscriber.wants(event):
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, event)
+
+
+class LocalBackend:
+    """Deliver events to this process only"""
+
+    def __init__(self, dispatch):
+        self.dispatch = dispatch
+
+    def publish(self, event):
+        self.dispatch(event)
+
+
+hub = Hub()
+backend = import_string(
+    getattr(settings, 'ORDER_EVENTS_BACKEND', 'shop.events.LocalBackend')
+)(hub.dispatch)
+
+
+def publish(event):
+    """Send the event to the backend once the surrounding transaction commits"""
+    transaction.on_commit(lambda: backend.publish(event))
+
+
+def order_created(order):
+    publish({
+        'type': 'order.created',
+        'order_id': order.id,
+        'customer_id': order.customer_id,
+        'status': order.status,
+        'at': timezone.now().isoformat(),
+    })
+
+
+def status_changed(order_id, customer_id, old_status, new_status):
+    publish({
+        'type': 'order.status_changed',
+        'order_id': order_id,
+        'customer_id': customer_id,
+        'from_status': old_status,
+        'status': new_status,
+        'at': timezone.now().isoformat(),
+    })
+
+
+def format_event(event):
+    data = {key: value for key, value in event.items() if key not in ('id', 'type')}
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+def _authenticate(raw_token):
+    """Return (user, customer_id) for a JWT access token, or None"""
+    authentication = JWTAuthentication()
+    try:
+        user = authentication.get_user(authentication.get_validated_token(raw_token))
+    except AuthenticationFailed:
+        return None
+    customer_id = Customer.objects.filter(user=user).values_list('id', flat=True).first()
+    return user, customer_id
+
+
+def _token_from_scope(scope, query):
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            parts = value.decode('latin-1').split()
+            if len(parts) == 2 and parts[0] == 'Bearer':
+                return parts[1]
+    # EventSource cannot send headers, so browsers pass ?token=
+    return query.get('token', [None])[0]
+
+
+async def _respond(send, status, body):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps(body).encode()})
+
+
+async def order_events_app(scope, receive, send):
+    """ASGI app streaming order events as text/event-stream"""
+    if scope['method'] != 'GET':
+        return await _respond(send, 405, {'error': 'Method not allowed'})
+
+    query = parse_qs(scope.get('query_string', b'').decode())
+    raw_token = _token_from_scope(scope, query)
+    identity = await sync_to_async(_authenticate)(raw_token) if raw_token else None
+    if identity is None:
+        return await _respond(send, 401, {'error': 'A valid access token is required'})
+    user, customer_id = identity
+    if not user.is_staff and customer_id is None:
+        return await _respond(send, 403, {'error': 'No customer profile for this user'})
+
+    try:
+        order_id = int(query['order'][0]) if 'order' in query else None
+    except ValueError:
+        return await _respond(send, 400, {'error': 'order must be an integer'})
+
+    subscriber = Subscriber(asyncio.get_running_loop(), customer_id, user.is_staff, order_id)
+    hub.subscribe(subscriber)
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+
+        while not subscriber.overflowed:
+            next_event = asyncio.ensure_future(subscriber.queue.get())
+            done, _ = await asyncio.wait(
+                {next_event, disconnected}, timeout=HEARTBEAT_SECONDS,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnected in done:
+                next_event.cancel()
+                return
+            if next_event in done:
+                body = format_event(next_event.result())
+            else:
+                next_event.cancel()
+                body = b': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        hub.unsubscribe(subscriber)
+        disconnected.cancel()
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
@@ -0,0 +1,68 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django import forms
+from django.core import exceptions
+from django.db import models
+from django.db.models.lookups import GreaterThanOrEqual, LessThan
+
+CENT = Decimal('0.01')
+
+
+def to_minor_units(amount):
+    """Convert a monetary amount (Decimal, str, int or float) to integer cents"""
+    if not isinstance(amount, Decimal):
+        amount = Decimal(str(amount))
+    return int((amount * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def from_minor_units(cents):
+    """Convert integer cents back to a two-place Decimal"""
+    return (Decimal(int(cents)) / 100).quantize(CENT)
+
+
+class MoneyField(models.BigIntegerField):
+    """Monetary amount stored as integer minor units and exposed as a Decimal.
+
+    The column is a plain integer, so sums and comparisons run as exact integer
+    arithmetic inside the database, while Python code, forms and lookups keep
+    working with Decimal amounts such as ``Decimal('12.50')``.
+    """
+    description = "Money amount stored in integer minor units"
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return from_minor_units(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Decimal):
+            return value
+        try:
+            return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+        except ArithmeticError:
+            raise exceptions.ValidationError(
+                self.error_messages['invalid'], code='invalid', params={'value': value},
+            )
+
+    def get_prep_value(self, value):
+        if value is None or hasattr(value, 'resolve_expression'):
+            return value
+        return to_minor_units(value)
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        return '' if value is None else str(value)
+
+    def formfield(self, **kwargs):
+        return models.Field.formfield(self, **{
+            'form_class': forms.DecimalField,
+            'decimal_places': 2,
+            **kwargs,
+        })
+
+
+# IntegerField's versions of these lookups round a float argument up to a
+# whole number before get_prep_value sees it, so 59.97 would become 6000
+# cents; the plain lookups leave the conversion to minor units to the field.
+MoneyField.register_lookup(GreaterThanOrEqual)
+MoneyField.register_lookup(LessThan)
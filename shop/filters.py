@@ -1,5 +1,7 @@
 import django_filters 
+from rest_framework import filters
 from .models import Product
+from . import catalog
 
 class ProductFilter(django_filters.FilterSet):
     """Advaced filtering for product model"""
@@ -18,7 +20,7 @@ class ProductFilter(django_filters.FilterSet):
 
     # Category filter
     category = django_filters.NumberFilter(field_name='category__id')
-    category_name = django_filters.CharFilter(field_name='category__name', lookup_expr='icontains')
+    category_name = django_filters.CharFilter(method='filter_category_name')
 
     class Meta:
         model = Product
@@ -27,8 +29,29 @@ class ProductFilter(django_filters.FilterSet):
             'color', 'min_price', 'max_price'
         ]
 
+    def filter_category_name(self, queryset, name, value):
+        """Match category names in memory, then filter products by category id"""
+        return queryset.filter(category_id__in=catalog.snapshot().ids_matching(value))
+
     def filter_in_stock(self, queryset, name, value):
         """Filter products that are in stock"""
         if value:
             return queryset.filter(stock__gt=0)
-        return queryset.filter(stock=0)
\ No newline at end of file
+        return queryset.filter(stock=0)
+
+class AliasOrderingFilter(filters.OrderingFilter):
+    """OrderingFilter that also accepts the view's ordering_aliases.
+
+    An alias maps one ?ordering= term to a list of order_by() terms, which
+    may be expressions and may span relations outside the ordering fields.
+    """
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        aliases = getattr(view, 'ordering_aliases', {})
+        ordering = []
+        for field in fields:
+            if field in aliases:
+                ordering.extend(aliases[field])
+            else:
+                ordering.extend(super().remove_invalid_fields(queryset, [field], view, request))
+        return ordering
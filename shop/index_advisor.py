@@ -0,0 +1,208 @@
+"""Derive the indexes the API needs from its viewsets and filters.
+
+Every viewset registered on the API router is read for its filterset_fields,
+filterset_class, ordering_fields, ordering and search_fields. Equality
+filters become compound (filter, default ordering) indexes, range filters
+and ordering fields single-column ones. A candidate is covered when an
+existing index, unique constraint or db_index column starts with the same
+columns. Text lookups and search fields cannot use a B-tree index and are
+only reported.
+"""
+import statistics
+import time
+from collections import namedtuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections, models
+
+RANGE_LOOKUPS = {'gt', 'gte', 'lt', 'lte', 'range'}
+EQUALITY_LOOKUPS = {'exact', 'in'}
+
+Candidate = namedtuple('Candidate', 'model fields reasons')
+Unindexable = namedtuple('Unindexable', 'model field reason')
+
+
+def _column(model, path):
+    """Map a filter path to a local field name, or None if it needs a join"""
+    name, _, rest = path.partition('__')
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    if not field.concrete:
+        return None
+    if rest and not (field.is_relation and rest in ('id', 'pk', field.target_field.name)):
+        return None
+    return field.name
+
+
+def _filters(viewset, model):
+    """Yield (field_name, lookup, source) for the viewset's declared filters"""
+    for name in getattr(viewset, 'filterset_fields', None) or ():
+        yield name, 'exact', 'filterset_fields'
+
+    filterset_class = getattr(viewset, 'filterset_class', None)
+    if filterset_class is not None:
+        for name, declared in filterset_class.base_filters.items():
+            if declared.method is not None:
+                continue
+            yield declared.field_name, declared.lookup_expr, f'{filterset_class.__name__}.{name}'
+
+
+def _default_ordering(viewset, model):
+    ordering = getattr(viewset, 'ordering', None) or model._meta.ordering or []
+    return [ordering] if isinstance(ordering, str) else list(ordering)
+
+
+def access_patterns(viewsets):
+    """Return ([Candidate], [Unindexable]) for the given viewset classes"""
+    candidates = {}
+    unindexable = []
+
+    def propose(model, fields, reason):
+        # A B-tree serves both scan directions, so direction is not part of the key
+        key = (model, tuple(_plain(fields)))
+        candidates.setdefault(key, Candidate(model, list(fields), []))
+        candidates[key].reasons.append(reason)
+
+    for viewset in viewsets:
+        queryset = getattr(viewset, 'queryset', None)
+        if queryset is None:
+            continue
+        model = queryset.model
+        ordering = [
+            field for field in _default_ordering(viewset, model)
+            if _column(model, field.lstrip('-'))
+        ]
+
+        for path, lookup, source in _filters(viewset, model):
+            column = _column(model, path)
+            if column is None:
+                unindexable.append(Unindexable(model, path, f'{source} joins to another table'))
+            elif lookup in EQUALITY_LOOKUPS:
+                leading = [column] + [field for field in ordering if field.lstrip('-') != column]
+                propose(model, leading, f'{viewset.__name__} filters on {column} ({source})')
+            elif lookup in RANGE_LOOKUPS:
+                propose(model, [column], f'{viewset.__name__} range filter on {column} ({source})')
+            else:
+                unindexable.append(Unindexable(model, path, f'{source} uses {lookup}'))
+
+        if ordering:
+            propose(model, ordering, f'{viewset.__name__} default ordering')
+        for field in getattr(viewset, 'ordering_fields', None) or ():
+            if field != '__all__' and _column(model, field):
+                propose(model, [field], f'{viewset.__name__} orders by {field}')
+
+        for field in getattr(viewset, 'search_fields', None) or ():
+            unindexable.append(Unindexable(model, field.lstrip('^=@$'), f'{viewset.__name__} search_fields'))
+
+    return _drop_prefixes(list(candidates.values())), unindexable
+
+
+def _plain(fields):
+    return [field.lstrip('-') for field in fields]
+
+
+def _drop_prefixes(candidates):
+    """Drop candidates whose columns are a prefix of another candidate on the same model"""
+    kept = []
+    for candidate in candidates:
+        columns = _plain(candidate.fields)
+        wider = [
+            other for other in candidates
+            if other is not candidate and other.model is candidate.model
+            and len(other.fields) > len(columns) and _plain(other.fields)[:len(columns)] == columns
+        ]
+        if wider:
+            wider[0].reasons.extend(candidate.reasons)
+        else:
+            kept.append(candidate)
+    return kept
+
+
+def existing_indexes(model):
+    """Column lists of every index the model declares, implicitly or explicitly"""
+    opts = model._meta
+    indexes = [_plain(index.fields) for index in opts.indexes]
+    indexes += [list(fields) for fields in opts.unique_together]
+    indexes += [list(fields) for fields in opts.index_together]
+    indexes += [
+        [field.name] for field in opts.concrete_fields
+        if field.primary_key or field.unique or field.db_index
+    ]
+    return indexes
+
+
+def is_covered(candidate):
+    columns = _plain(candidate.fields)
+    return any(index[:len(columns)] == columns for index in existing_indexes(candidate.model))
+
+
+def missing_indexes(viewsets):
+    candidates, unindexable = access_patterns(viewsets)
+    return [candidate for candidate in candidates if not is_covered(candidate)], unindexable
+
+
+def representative_query(candidate, page_size=20):
+    """The query an API page would run for this access pattern"""
+    model = candidate.model
+    queryset = model._default_manager.all()
+    leading = candidate.fields[0].lstrip('-')
+    if len(candidate.fields) > 1:
+        field = model._meta.get_field(leading)
+        value = queryset.values_list(field.attname, flat=True).order_by().first()
+        queryset = queryset.filter(**{field.attname: value})
+        ordering = candidate.fields[1:]
+    else:
+        ordering = candidate.fields
+    return queryset.order_by(*ordering)[:page_size]
+
+
+def explain(queryset):
+    try:
+        return queryset.explain()
+    except Exception:
+        # Not every backend (djongo among them) implements EXPLAIN
+        return None
+
+
+def time_query(queryset, repeat=20):
+    """Median wall time of evaluating queryset, in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        list(queryset._chain())
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def index_for(candidate, name=None):
+    columns = '_'.join(_plain(candidate.fields))
+    return models.Index(
+        fields=candidate.fields,
+        name=name or f'adv_{candidate.model._meta.model_name[:8]}_{columns}'[:30],
+    )
+
+
+def benchmark(candidate, repeat=20, using='default'):
+    """Time the representative query without and with the index, then drop it"""
+    queryset = representative_query(candidate).using(using)
+    index = index_for(candidate)
+    before = time_query(queryset, repeat)
+    plan_before = explain(queryset)
+
+    connection = connections[using]
+    with connection.schema_editor() as editor:
+        editor.add_index(candidate.model, index)
+    try:
+        after = time_query(queryset, repeat)
+        plan_after = explain(queryset)
+    finally:
+        with connection.schema_editor() as editor:
+            editor.remove_index(candidate.model, index)
+    return {
+        'before_ms': before,
+        'after_ms': after,
+        'plan_before': plan_before,
+        'plan_after': plan_after,
+    }
@@ -0,0 +1,254 @@
+"""Bestseller leaderboard maintained incrementally from order writes.
+
+Units sold are kept in counter tables: ProductSales holds the all-time total
+per product, ProductSalesBucket hourly buckets and ProductSalesWindow the
+rolled-up total of every rolling 24h/7d/30d window. Order creation adds to
+all of them, cancelling an order subtracts from the bucket and the windows
+it was originally counted in. As hours leave a window, advance() subtracts
+just those expired buckets from its totals, so a top-N list is one indexed
+read whatever the window, and the result is cached on top of that.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import (
+    ArchivedOrderItem, LeaderboardWindow, OrderItem, Product, ProductSales, ProductSalesBucket,
+    ProductSalesWindow,
+)
+from . import archive
+
+WINDOWS = {
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+    'all': None,
+}
+MAX_LIMIT = 50
+BUCKET_RETENTION = timedelta(days=31)
+CACHE_TIMEOUT = getattr(settings, 'LEADERBOARD_CACHE_TIMEOUT', 60)
+
+
+def bucket_start(moment):
+    """Truncate a datetime to the start of its hourly bucket"""
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _increment(model, deltas, key_fields, value_field, extra_fields):
+    """Apply {key: delta} to counter rows, creating the missing ones"""
+    if not deltas:
+        return
+
+    lookup = {f'{field}__in': {key[i] for key in deltas} for i, field in enumerate(key_fields)}
+    existing = {
+        row[1:]: row[0]
+        for row in model.objects.filter(**lookup).values_list('pk', *key_fields)
+    }
+
+    # One UPDATE per distinct delta instead of one per row
+    by_delta = {}
+    for key, delta in deltas.items():
+        if key in existing and delta:
+            by_delta.setdefault(delta, []).append(existing[key])
+    for delta, pks in by_delta.items():
+        model.objects.filter(pk__in=pks).update(**{value_field: F(value_field) + delta})
+
+    model.objects.bulk_create(
+        [
+            model(**dict(zip(key_fields, key)), **{value_field: delta}, **extra_fields[key])
+            for key, delta in deltas.items() if key not in existing
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def _rolling_windows():
+    return [window for window, span in WINDOWS.items() if span is not None]
+
+
+def _window_starts():
+    """{window: oldest bucket counted in its totals}, for windows set up by rebuild()"""
+    return dict(LeaderboardWindow.objects.values_list('window', 'expired_before'))
+
+
+def record_orders(order_ids, sign=1, archived=False):
+    """Add (sign=1) or remove (sign=-1) the items of the given orders from the counters"""
+    totals = Counter()
+    buckets = Counter()
+    windows = Counter()
+    categories = {}
+    oldest = timezone.now() - BUCKET_RETENTION
+    starts = _window_starts()
+
+    item_model = ArchivedOrderItem if archived else OrderItem
+    items = item_model.objects.filter(order_id__in=order_ids).values_list(
+        'product_id', 'product__category_id', 'quantity', 'order__created_at'
+    )
+    for product_id, category_id, quantity, created_at in items:
+        categories[product_id] = category_id
+        totals[(product_id,)] += sign * quantity
+        if created_at >= oldest:
+            bucket = bucket_start(created_at)
+            buckets[(product_id, bucket)] += sign * quantity
+            for window, start in starts.items():
+                if bucket >= start:
+                    windows[(product_id, window)] += sign * quantity
+
+    with transaction.atomic():
+        _increment(
+            ProductSales, totals, ['product_id'], 'total_sold',
+            {key: {'category_id': categories[key[0]]} for key in totals},
+        )
+        _increment(
+            ProductSalesBucket, buckets, ['product_id', 'bucket'], 'quantity',
+            {key: {'category_id': categories[key[0]]} for key in buckets},
+        )
+        _increment(
+            ProductSalesWindow, windows, ['product_id', 'window'], 'quantity',
+            {key: {'category_id': categories[key[0]]} for key in windows},
+        )
+
+
+def advance(now=None):
+    """Subtract the buckets that left each rolling window since the last call"""
+    now = now or timezone.now()
+    for window, start in _window_starts().items():
+        expired_before = bucket_start(now - WINDOWS[window])
+        if expired_before <= start:
+            continue
+        # Claim the range first so concurrent callers never subtract it twice
+        claimed = LeaderboardWindow.objects.filter(window=window, expired_before=start).update(
+            expired_before=expired_before
+        )
+        if not claimed:
+            continue
+        expired = Counter()
+        categories = {}
+        for product_id, category_id, quantity in (
+            ProductSalesBucket.objects.filter(bucket__gte=start, bucket__lt=expired_before)
+            .values('product_id', 'category_id').annotate(sold=Sum('quantity'))
+            .values_list('product_id', 'category_id', 'sold')
+        ):
+            categories[product_id] = category_id
+            expired[(product_id, window)] -= quantity
+        _increment(
+            ProductSalesWindow, expired, ['product_id', 'window'], 'quantity',
+            {key: {'category_id': categories[key[0]]} for key in expired},
+        )
+
+
+def status_changed(order_ids, old_status, new_status):
+    """Keep the counters in sync when orders move into or out of cancelled"""
+    if old_status != 'cancelled' and new_status == 'cancelled':
+        record_orders(order_ids, sign=-1)
+    elif old_status == 'cancelled' and new_status != 'cancelled':
+        record_orders(order_ids, sign=1)
+
+
+def rebuild():
+    """Recompute all counters from non-cancelled live and archived orders"""
+    totals = Counter()
+    buckets = Counter()
+    categories = {}
+    oldest = timezone.now() - BUCKET_RETENTION
+
+    items = archive.order_items('product_id', 'product__category_id', 'quantity', 'order__created_at')
+    for product_id, category_id, quantity, created_at in items:
+        categories[product_id] = category_id
+        totals[product_id] += quantity
+        if created_at >= oldest:
+            buckets[(product_id, bucket_start(created_at))] += quantity
+
+    now = timezone.now()
+    starts = {window: bucket_start(now - WINDOWS[window]) for window in _rolling_windows()}
+    windows = Counter()
+    for (product_id, bucket), quantity in buckets.items():
+        for window, start in starts.items():
+            if bucket >= start:
+                windows[(product_id, window)] += quantity
+
+    with transaction.atomic():
+        ProductSales.objects.all().delete()
+        ProductSalesBucket.objects.all().delete()
+        ProductSalesWindow.objects.all().delete()
+        LeaderboardWindow.objects.all().delete()
+        ProductSales.objects.bulk_create([
+            ProductSales(product_id=product_id, category_id=categories[product_id], total_sold=total)
+            for product_id, total in totals.items()
+        ], batch_size=1000)
+        ProductSalesBucket.objects.bulk_create([
+            ProductSalesBucket(
+                product_id=product_id, category_id=categories[product_id],
+                bucket=bucket, quantity=quantity
+            )
+            for (product_id, bucket), quantity in buckets.items()
+        ], batch_size=1000)
+        ProductSalesWindow.objects.bulk_create([
+            ProductSalesWindow(
+                product_id=product_id, category_id=categories[product_id],
+                window=window, quantity=quantity
+            )
+            for (product_id, window), quantity in windows.items()
+        ], batch_size=1000)
+        LeaderboardWindow.objects.bulk_create([
+            LeaderboardWindow(window=window, expired_before=start) for window, start in starts.items()
+        ])
+
+    return {'products': len(totals), 'buckets': len(buckets)}
+
+
+def prune():
+    """Drop hourly buckets that no window reaches any more"""
+    advance()
+    cutoff = bucket_start(timezone.now() - BUCKET_RETENTION)
+    return ProductSalesBucket.objects.filter(bucket__lt=cutoff).delete()[0]
+
+
+def _ranking(window, category_id):
+    if WINDOWS[window] is None:
+        queryset = ProductSales.objects.filter(total_sold__gt=0)
+        if category_id is not None:
+            queryset = queryset.filter(category_id=category_id)
+        return list(queryset.order_by('-total_sold', 'product_id').values_list(
+            'product_id', 'total_sold'
+        )[:MAX_LIMIT])
+
+    advance()
+    queryset = ProductSalesWindow.objects.filter(window=window, quantity__gt=0)
+    if category_id is not None:
+        queryset = queryset.filter(category_id=category_id)
+    return list(queryset.order_by('-quantity', 'product_id').values_list(
+        'product_id', 'quantity'
+    )[:MAX_LIMIT])
+
+
+def top_sellers(window='all', category_id=None, limit=10):
+    """Return [(product_id, units_sold)] for the window, best first"""
+    if window not in WINDOWS:
+        raise ValueError(f"Unknown window '{window}'")
+
+    key = f'leaderboard:{window}:{category_id or "all"}'
+    ranking = cache.get(key)
+    if ranking is None:
+        ranking = _ranking(window, category_id)
+        cache.set(key, ranking, CACHE_TIMEOUT)
+    return ranking[:min(limit, MAX_LIMIT)]
+
+
+def bestseller_products(window='all', category_id=None, limit=10):
+    """Return the top sellers as Product instances annotated with total_sold"""
+    ranking = top_sellers(window, category_id, limit)
+    products = Product.objects.select_related('rating_summary').in_bulk([pk for pk, _ in ranking])
+
+    result = []
+    for product_id, sold in ranking:
+        product = products.get(product_id)
+        if product is not None:
+            product.total_sold = sold
+            result.append(product)
+    return result
@@ -0,0 +1,166 @@
+"""Request-scoped identity map that batches relation loading for serializers.
+
+Before a serializer renders, prime() walks its fields (and those of nested
+serializers) to find the foreign keys and reverse relations they will read,
+then loads each related model once for every instance in the response:
+one ``pk__in`` query per model for foreign keys and one prefetch per reverse
+relation. Loaded rows are attached to the instances' relation caches, so
+fields such as ``source='customer.full_name'`` work unchanged, and kept in
+the identity map, so later serializers in the same request reuse them.
+Relations already loaded through select_related/prefetch_related are left
+alone and only recorded in the map. Serializers with computed fields that
+need their own queries, such as counts, can define batch_load(instances) to
+fill them for the whole page at once.
+"""
+from collections import defaultdict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import prefetch_related_objects
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+
+class IdentityMap:
+    """Model instances loaded during one request, keyed by model and pk"""
+
+    def __init__(self):
+        self.rows = defaultdict(dict)
+
+    def remember(self, objects):
+        for obj in objects:
+            self.rows[type(obj)].setdefault(obj.pk, obj)
+
+    def load(self, model, pks):
+        """Return {pk: instance} for pks, querying only the ones not seen yet"""
+        known = self.rows[model]
+        missing = {pk for pk in pks if pk not in known}
+        if missing:
+            self.remember(model._default_manager.filter(pk__in=missing))
+        return {pk: known[pk] for pk in pks if pk in known}
+
+    def attach(self, instances, field):
+        """Fill the forward relation cache of instances, returning the related objects"""
+        related = []
+        unresolved = []
+        for instance in instances:
+            if field.is_cached(instance):
+                obj = field.get_cached_value(instance)
+                if obj is not None:
+                    related.append(obj)
+            elif getattr(instance, field.attname) is not None:
+                unresolved.append(instance)
+
+        self.remember(related)
+        loaded = self.load(field.related_model, {getattr(instance, field.attname) for instance in unresolved})
+        for instance in unresolved:
+            obj = loaded.get(getattr(instance, field.attname))
+            field.set_cached_value(instance, obj)
+            if obj is not None:
+                related.append(obj)
+        return related
+
+
+def identity_map(context):
+    """The identity map of the serializer context's request, or of the context itself"""
+    request = context.get('request')
+    holder = getattr(request, '_request', request)
+    if holder is None:
+        return context.setdefault('identity_map', IdentityMap())
+    if not hasattr(holder, 'identity_map'):
+        holder.identity_map = IdentityMap()
+    return holder.identity_map
+
+
+def _model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def _by_model(instances):
+    groups = defaultdict(list)
+    for instance in instances:
+        groups[type(instance)].append(instance)
+    return groups
+
+
+def _walk(instances, path, field, identity, whole_object=False):
+    """Load the relations along a field's source path for instances of one model"""
+    model = type(instances[0])
+    for position, name in enumerate(path):
+        model_field = _model_field(model, name)
+        if model_field is None or not model_field.is_relation or model_field.name != name:
+            return
+        last = position == len(path) - 1
+
+        if model_field.many_to_one or (model_field.one_to_one and model_field.concrete):
+            # A bare relation is rendered as its pk and needs no load
+            if last and not (whole_object or isinstance(field, BaseSerializer)):
+                return
+            instances = identity.attach(instances, model_field)
+        elif model_field.one_to_many or model_field.many_to_many:
+            prefetch_related_objects(instances, name)
+            instances = [obj for instance in instances for obj in getattr(instance, name).all()]
+            identity.remember(instances)
+        elif model_field.one_to_one:
+            # Reverse one-to-one such as Product.rating_summary, missing rows cached as None
+            prefetch_related_objects(instances, name)
+            instances = [
+                obj for obj in (model_field.get_cached_value(instance, None) for instance in instances)
+                if obj is not None
+            ]
+            identity.remember(instances)
+        else:
+            return
+
+        if not instances:
+            return
+        model = type(instances[0])
+
+    nested = field.child if isinstance(field, ListSerializer) else field
+    if isinstance(nested, BaseSerializer):
+        prime(nested, instances, identity)
+
+
+def prime(serializer, instances, identity):
+    """Batch-load every relation serializer's fields read from instances.
+
+    Computed fields are followed through Meta.field_dependencies, the same
+    mapping the queryset projection uses.
+    """
+    dependencies = getattr(getattr(serializer, 'Meta', None), 'field_dependencies', {})
+    for group in _by_model(instances).values():
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in dependencies:
+                for path in dependencies[name]:
+                    _walk(group, path.split('__'), field, identity, whole_object=True)
+            elif field.source_attrs:
+                _walk(group, field.source_attrs, field, identity)
+        if hasattr(serializer, 'batch_load'):
+            serializer.batch_load(group)
+
+
+class BatchLoadingListSerializer(ListSerializer):
+    """ListSerializer that primes the request's identity map for the whole page"""
+
+    def to_representation(self, data):
+        instances = list(data.all() if isinstance(data, models.Manager) else data)
+        if self.parent is None:
+            prime(self.child, instances, identity_map(self.context))
+        return super().to_representation(instances)
+
+
+class BatchLoadingMixin:
+    """Serializer mixin priming relations for single objects and, via Meta, for lists.
+
+    Set ``list_serializer_class = BatchLoadingListSerializer`` in Meta to
+    batch many=True renders as well.
+    """
+
+    def to_representation(self, instance):
+        if self.parent is None:
+            prime(self, [instance], identity_map(self.context))
+        return super().to_representation(instance)
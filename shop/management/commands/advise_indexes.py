@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import index_advisor
+from shop.urls import router
+
+
+class Command(BaseCommand):
+    help = 'Compare the indexes the API filters and orderings need with the ones models declare'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--benchmark', action='store_true',
+            help='Time each missing index on this database by creating and dropping it temporarily',
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Exit with an error if any index is missing (for CI)',
+        )
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        viewsets = [viewset for _, viewset, _ in router.registry]
+        missing, unindexable = index_advisor.missing_indexes(viewsets)
+
+        if not missing:
+            self.stdout.write(self.style.SUCCESS('Every filter and ordering used by the API is indexed'))
+        for candidate in missing:
+            index = index_advisor.index_for(candidate)
+            self.stdout.write(self.style.WARNING(
+                f'{candidate.model.__name__}: models.Index(fields={candidate.fields!r})'
+            ))
+            for reason in dict.fromkeys(candidate.reasons):
+                self.stdout.write(f'    needed because {reason}')
+
+            if options['benchmark']:
+                result = index_advisor.benchmark(candidate, options['repeat'], options['database'])
+                self.stdout.write(
+                    f"    {result['before_ms']:.2f}ms -> {result['after_ms']:.2f}ms "
+                    f"(median of {options['repeat']}, temporary index {index.name})"
+                )
+                for label in ('plan_before', 'plan_after'):
+                    if result[label]:
+                        self.stdout.write(f"    {label.replace('_', ' ')}: {' | '.join(result[label].splitlines())}")
+
+        if unindexable and options['verbosity'] > 1:
+            self.stdout.write('\nNot served by a B-tree index:')
+            for entry in unindexable:
+                self.stdout.write(f'    {entry.model.__name__}.{entry.field}: {entry.reason}')
+
+        if missing:
+            self.stdout.write(
+                '\nAdd the indexes above to the models\' Meta.indexes and run makemigrations.'
+            )
+            if options['check']:
+                raise CommandError(f'{len(missing)} missing indexes')
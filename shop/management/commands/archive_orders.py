@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shop import archive
+
+
+class Command(BaseCommand):
+    help = 'Move old delivered and cancelled orders into the archive tables (safe to re-run)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int, default=archive.ARCHIVE_AFTER.days,
+            help='Archive closed orders created more than this many days ago',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--limit', type=int, help='Stop after archiving this many orders')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report how many orders would be archived',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+
+        if options['dry_run']:
+            count = archive.archivable_orders(cutoff).count()
+            self.stdout.write(f'{count} orders created before {cutoff:%Y-%m-%d} would be archived')
+            return
+
+        total_orders = total_items = 0
+        for orders, items in archive.archive(cutoff, options['batch_size'], options['limit']):
+            total_orders += orders
+            total_items += items
+            self.stdout.write(f'Archived {orders} orders ({items} items)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {total_orders} orders and {total_items} items created before {cutoff:%Y-%m-%d}'
+        ))
@@ -0,0 +1,53 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the recommendation build on synthetic order data (no database access)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=100000)
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--max-basket', type=int, default=6)
+        parser.add_argument('--top-k', type=int, default=recommendations.TOP_K)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        products = range(1, options['products'] + 1)
+        # Zipf-like popularity so a few products dominate, as in real catalogs
+        weights = [1 / rank for rank in products]
+        baskets = [
+            rng.choices(products, weights, k=rng.randint(1, options['max_basket']))
+            for _ in range(options['orders'])
+        ]
+
+        start = time.perf_counter()
+        item_counts, pair_counts = recommendations.build_cooccurrence(baskets)
+        built = time.perf_counter()
+        neighbours = {
+            product_id: recommendations.top_neighbours(product_id, row, item_counts, options['top_k'])
+            for product_id, row in pair_counts.items()
+        }
+        ranked = time.perf_counter()
+
+        pairs = sum(len(row) for row in pair_counts.values())
+        self.stdout.write(f"orders:        {options['orders']}")
+        self.stdout.write(f"products:      {len(item_counts)}")
+        self.stdout.write(f"nonzero pairs: {pairs}")
+        self.stdout.write(
+            f"co-occurrence: {built - start:.3f}s "
+            f"({options['orders'] / max(built - start, 1e-9):,.0f} orders/s)"
+        )
+        self.stdout.write(f"top-{options['top_k']} ranking: {ranked - built:.3f}s for {len(neighbours)} products")
+
+        # Incremental path: one new order touching a handful of products
+        basket = baskets[0]
+        start = time.perf_counter()
+        for a in set(basket):
+            recommendations.top_neighbours(a, pair_counts[a], item_counts, options['top_k'])
+        self.stdout.write(f"incremental refresh of one order: {(time.perf_counter() - start) * 1000:.2f}ms")
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shop.models import MediaBlob
+from shop.signals import MEDIA_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Recount media references and delete content-addressed files nothing points at'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=int, default=24,
+                            help='Keep unreferenced files younger than this, e.g. uploads not yet saved')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        counts = {}
+        for model, fields in MEDIA_FIELDS.items():
+            for field in fields:
+                for name in model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}) \
+                        .values_list(field, flat=True).iterator():
+                    counts[name] = counts.get(name, 0) + 1
+
+        # Recount from the source of truth to repair drift from bulk updates
+        for blob in MediaBlob.objects.all().iterator():
+            if blob.ref_count != counts.get(blob.name, 0) and not options['dry_run']:
+                MediaBlob.objects.filter(pk=blob.pk).update(ref_count=counts.get(blob.name, 0))
+
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        orphans = [
+            blob for blob in MediaBlob.objects.filter(created_at__lt=cutoff).iterator()
+            if not counts.get(blob.name)
+        ]
+
+        freed = 0
+        for blob in orphans:
+            freed += blob.size
+            if not options['dry_run']:
+                default_storage.delete(blob.name)
+                blob.delete()
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {len(orphans)} orphaned files ({freed / 1024 / 1024:.1f} MiB)'
+        ))
@@ -0,0 +1,62 @@
+import csv
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import provisioning
+
+
+def read_records(handle, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(handle)
+        return
+    for line in handle:
+        if line.strip():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as exc:
+                record = provisioning.InvalidRecord(f'Invalid JSON: {exc}')
+            yield record
+
+
+class Command(BaseCommand):
+    help = 'Create users and customers in bulk from a JSON lines or CSV export of accounts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for standard input")
+        parser.add_argument(
+            '--format', choices=['jsonl', 'csv'],
+            help='Input format (default: from the file extension, jsonl for stdin)',
+        )
+        parser.add_argument('--chunk-size', type=int, default=provisioning.CHUNK_SIZE)
+        parser.add_argument('--conflicts', help='Write rejected rows to this JSON lines file')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+
+        try:
+            handle = sys.stdin if path == '-' else open(path, newline='')
+        except OSError as exc:
+            raise CommandError(str(exc))
+        conflicts_file = open(options['conflicts'], 'w') if options['conflicts'] else None
+
+        created = rejected = 0
+        try:
+            for chunk_created, conflicts in provisioning.provision(read_records(handle, fmt), options['chunk_size']):
+                created += chunk_created
+                rejected += len(conflicts)
+                for conflict in conflicts:
+                    if conflicts_file:
+                        conflicts_file.write(json.dumps(conflict) + '\n')
+                    else:
+                        self.stderr.write(f"row {conflict['row']} ({conflict['email']}): {conflict['error']}")
+                self.stdout.write(f'{created} accounts created, {rejected} rejected so far')
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+            if conflicts_file:
+                conflicts_file.close()
+
+        self.stdout.write(self.style.SUCCESS(f'Imported {created} accounts, rejected {rejected}'))
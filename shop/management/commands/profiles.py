@@ -0,0 +1,54 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import profiling
+
+
+class Command(BaseCommand):
+    help = 'List, render or authorize on-demand request profiles'
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='action', required=True)
+
+        subparsers.add_parser('list', help='List stored profiles, newest first')
+        subparsers.add_parser('token', help='Print a signed X-Profile header value')
+
+        render = subparsers.add_parser('render', help='Render a stored profile')
+        render.add_argument('name')
+        render.add_argument(
+            '--format', choices=['top', 'collapsed', 'speedscope'], default='top',
+            help='top: self-time summary; collapsed: flamegraph.pl input; speedscope: JSON file'
+        )
+        render.add_argument('--limit', type=int, default=20)
+
+    def handle(self, *args, **options):
+        getattr(self, f"handle_{options['action']}")(**options)
+
+    def handle_list(self, **options):
+        profiles = profiling.list_profiles()
+        if not profiles:
+            self.stdout.write(f'No profiles in {profiling.profile_dir()}')
+        for meta in profiles:
+            self.stdout.write(
+                f"{meta['name']}  {meta['status']}  {meta['duration_ms']}ms  "
+                f"{meta['samples']} samples  {meta['sql_count']} queries ({meta['sql_ms']}ms)"
+            )
+
+    def handle_token(self, **options):
+        self.stdout.write(profiling.make_token())
+
+    def handle_render(self, name, format, limit, **options):
+        try:
+            if format == 'speedscope':
+                self.stdout.write(json.dumps(profiling.to_speedscope(name)))
+            elif format == 'collapsed':
+                for stack, count in profiling.load_stacks(name):
+                    self.stdout.write(f"{';'.join(stack)} {count}")
+            else:
+                ranked = profiling.self_time(name, limit)
+                total = sum(count for _, count in profiling.load_stacks(name)) or 1
+                for frame, count in ranked:
+                    self.stdout.write(f'{count * 100 / total:6.1f}%  {count:6d}  {frame}')
+        except FileNotFoundError:
+            raise CommandError(f"Profile '{name}' not found")
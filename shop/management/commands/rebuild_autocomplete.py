@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from shop import autocomplete
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the customer and product autocomplete indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind', action='append', choices=list(autocomplete.INDEXES),
+            help='Index to rebuild, may be repeated (default: all)'
+        )
+
+    def handle(self, *args, **options):
+        for kind in options['kind'] or autocomplete.INDEXES:
+            autocomplete.rebuild(kind)
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {kind} autocomplete index'))
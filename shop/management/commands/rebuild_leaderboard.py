@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from shop import leaderboard
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the bestseller counters from order history, or prune expired hourly buckets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--prune', action='store_true',
+            help='Only delete hourly buckets older than the longest rolling window',
+        )
+
+    def handle(self, *args, **options):
+        if options['prune']:
+            deleted = leaderboard.prune()
+            self.stdout.write(self.style.SUCCESS(f'Pruned {deleted} expired buckets'))
+            return
+
+        stats = leaderboard.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt bestseller counters for {stats['products']} products ({stats['buckets']} hourly buckets)"
+        ))
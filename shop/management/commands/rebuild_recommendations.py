@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from shop import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product co-occurrence matrix and top-K recommendations from order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=recommendations.TOP_K)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        stats = recommendations.rebuild(k=options['top_k'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt recommendations for {stats['products']} products "
+            f"({stats['pairs']} pairs, {stats['recommendations']} neighbours stored)"
+        ))
@@ -0,0 +1,56 @@
+# Generated by Django 3.2 on 2026-10-19 12:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_product_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSalesBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.category')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_sold', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.category')),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sales', to='shop.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Product sales',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='productsalesbucket',
+            index=models.Index(fields=['bucket'], name='shop_produc_bucket_7cf646_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productsalesbucket',
+            index=models.Index(fields=['category', 'bucket'], name='shop_produc_categor_513c73_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='productsalesbucket',
+            unique_together={('product', 'bucket')},
+        ),
+        migrations.AddIndex(
+            model_name='productsales',
+            index=models.Index(fields=['-total_sold'], name='shop_produc_total_s_44c6e7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productsales',
+            index=models.Index(fields=['category', '-total_sold'], name='shop_produc_categor_291e9a_idx'),
+        ),
+    ]
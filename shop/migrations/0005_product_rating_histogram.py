@@ -0,0 +1,40 @@
+# Generated by Django 3.2 on 2026-10-19 12:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_histograms(apps, schema_editor):
+    Review = apps.get_model('shop', 'Review')
+    ProductRating = apps.get_model('shop', 'ProductRating')
+
+    histograms = {}
+    for product_id, rating in Review.objects.values_list('product_id', 'rating').iterator():
+        histogram = histograms.setdefault(product_id, ProductRating(product_id=product_id))
+        field = f'stars_{rating}'
+        setattr(histogram, field, getattr(histogram, field) + 1)
+
+    ProductRating.objects.bulk_create(histograms.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_bestseller_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRating',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stars_1', models.IntegerField(default=0)),
+                ('stars_2', models.IntegerField(default=0)),
+                ('stars_3', models.IntegerField(default=0)),
+                ('stars_4', models.IntegerField(default=0)),
+                ('stars_5', models.IntegerField(default=0)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='rating_summary', to='shop.product')),
+            ],
+        ),
+        migrations.RunPython(build_histograms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,88 @@
+from decimal import Decimal
+
+import django.core.validators
+from django.db import migrations, models
+
+import shop.fields
+
+
+def floats_to_minor_units(apps, schema_editor):
+    for model_name, source, target in [
+        ('Order', 'total_price', 'total_price_minor'),
+        ('OrderItem', 'subtotal', 'subtotal_minor'),
+    ]:
+        model = apps.get_model('shop', model_name)
+        # One UPDATE per row: bulk_update's CASE/WHEN is not supported by djongo
+        for pk, amount in model.objects.values_list('pk', source).iterator():
+            # MoneyField rounds the Decimal to whole cents when saving
+            model.objects.filter(pk=pk).update(**{target: Decimal(str(amount or 0))})
+
+
+def minor_units_to_floats(apps, schema_editor):
+    for model_name, source, target in [
+        ('Order', 'total_price_minor', 'total_price'),
+        ('OrderItem', 'subtotal_minor', 'subtotal'),
+    ]:
+        model = apps.get_model('shop', model_name)
+        for pk, amount in model.objects.values_list('pk', source).iterator():
+            model.objects.filter(pk=pk).update(**{target: float(amount)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_order_status_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_price_minor',
+            field=shop.fields.MoneyField(default=0),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='subtotal_minor',
+            field=shop.fields.MoneyField(default=0),
+        ),
+        # A default on the float columns keeps the migration reversible
+        migrations.AlterField(
+            model_name='order',
+            name='total_price',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0.0)]),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='subtotal',
+            field=models.FloatField(default=0.0, validators=[django.core.validators.MinValueValidator(0.0)]),
+        ),
+        migrations.RunPython(floats_to_minor_units, minor_units_to_floats),
+        migrations.RemoveField(
+            model_name='order',
+            name='total_price',
+        ),
+        migrations.RemoveField(
+            model_name='orderitem',
+            name='subtotal',
+        ),
+        migrations.RenameField(
+            model_name='order',
+            old_name='total_price_minor',
+            new_name='total_price',
+        ),
+        migrations.RenameField(
+            model_name='orderitem',
+            old_name='subtotal_minor',
+            new_name='subtotal',
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='total_price',
+            field=shop.fields.MoneyField(validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='subtotal',
+            field=shop.fields.MoneyField(validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+    ]
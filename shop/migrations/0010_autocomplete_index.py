@@ -0,0 +1,48 @@
+# Generated by Django 3.2 on 2026-10-19 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_media_blobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AutocompleteTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('field', models.CharField(max_length=50)),
+                ('key', models.CharField(max_length=255)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AutocompleteTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('trigram', models.CharField(max_length=3)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='autocompletetrigram',
+            index=models.Index(fields=['kind', 'trigram'], name='shop_autoco_kind_37af06_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='autocompletetrigram',
+            index=models.Index(fields=['kind', 'object_id'], name='shop_autoco_kind_d6cab7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='autocompleteterm',
+            index=models.Index(fields=['kind', 'key'], name='shop_autoco_kind_e8c11c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='autocompleteterm',
+            index=models.Index(fields=['kind', 'object_id'], name='shop_autoco_kind_65ab15_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2 on 2026-10-19 13:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_api_access_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPopularity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('views', models.BigIntegerField(default=0)),
+                ('score', models.FloatField(default=0.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='popularity', to='shop.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Product popularity',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='productpopularity',
+            index=models.Index(fields=['-score'], name='shop_produc_score_d3f33d_idx'),
+        ),
+    ]
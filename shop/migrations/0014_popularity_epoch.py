@@ -0,0 +1,34 @@
+# Generated by Django 3.2 on 2026-10-19 13:15
+import time
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+# Scores written before epochs existed were relative to 2024-01-01 UTC
+OLD_LANDMARK = 1704067200
+EPOCH_HALF_LIVES = 64
+
+
+def rebase_to_current_epoch(apps, schema_editor):
+    half_life = getattr(settings, 'PRODUCT_POPULARITY_HALF_LIFE_HOURS', 24 * 7) * 3600
+    epoch_seconds = half_life * EPOCH_HALF_LIVES
+    epoch = int(time.time() // epoch_seconds)
+    factor = 2.0 ** ((OLD_LANDMARK - epoch * epoch_seconds) / half_life)
+    apps.get_model('shop', 'ProductPopularity').objects.update(score=F('score') * factor, epoch=epoch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_product_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productpopularity',
+            name='epoch',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(rebase_to_current_epoch, migrations.RunPython.noop),
+    ]
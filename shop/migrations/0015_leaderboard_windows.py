@@ -0,0 +1,82 @@
+# Generated by Django 3.2 on 2026-10-19 13:24
+
+from collections import Counter
+from datetime import timedelta
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+WINDOWS = {'24h': timedelta(hours=24), '7d': timedelta(days=7), '30d': timedelta(days=30)}
+
+
+def roll_up_buckets(apps, schema_editor):
+    """Seed the window totals from the hourly buckets already stored"""
+    ProductSalesBucket = apps.get_model('shop', 'ProductSalesBucket')
+    ProductSalesWindow = apps.get_model('shop', 'ProductSalesWindow')
+    LeaderboardWindow = apps.get_model('shop', 'LeaderboardWindow')
+
+    now = timezone.now().replace(minute=0, second=0, microsecond=0)
+    starts = {window: now - span for window, span in WINDOWS.items()}
+    totals = Counter()
+    categories = {}
+    for product_id, category_id, bucket, quantity in ProductSalesBucket.objects.filter(
+        bucket__gte=min(starts.values())
+    ).values_list('product_id', 'category_id', 'bucket', 'quantity').iterator():
+        categories[product_id] = category_id
+        for window, start in starts.items():
+            if bucket >= start:
+                totals[(product_id, window)] += quantity
+
+    ProductSalesWindow.objects.bulk_create([
+        ProductSalesWindow(product_id=product_id, category_id=categories[product_id], window=window, quantity=quantity)
+        for (product_id, window), quantity in totals.items()
+    ], batch_size=1000)
+    LeaderboardWindow.objects.bulk_create([
+        LeaderboardWindow(window=window, expired_before=start) for window, start in starts.items()
+    ])
+
+
+def drop_window_totals(apps, schema_editor):
+    apps.get_model('shop', 'ProductSalesWindow').objects.all().delete()
+    apps.get_model('shop', 'LeaderboardWindow').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_popularity_epoch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardWindow',
+            fields=[
+                ('window', models.CharField(max_length=8, primary_key=True, serialize=False)),
+                ('expired_before', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductSalesWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(max_length=8)),
+                ('quantity', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.category')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shop.product')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='productsaleswindow',
+            index=models.Index(fields=['window', '-quantity'], name='shop_produc_window_c83523_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productsaleswindow',
+            index=models.Index(fields=['window', 'category', '-quantity'], name='shop_produc_window_8efab9_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='productsaleswindow',
+            unique_together={('product', 'window')},
+        ),
+        migrations.RunPython(roll_up_buckets, drop_window_totals),
+    ]
@@ -0,0 +1,205 @@
+import hashlib
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from rest_framework.serializers import BaseSerializer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .serializers import SparseFieldsMixin
+from .sync import changes_since
+
+
+class ChangeFeedMixin:
+    """Adds a `changes` action returning records upserted or deleted since a sync token"""
+    change_feed_limit = 500
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', self.change_feed_limit)), self.change_feed_limit)
+            changes = changes_since(self.get_queryset(), request.query_params.get('since'), max(limit, 1))
+        except ValueError:
+            return Response(
+                {'error': 'Invalid sync token or limit'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = self.get_serializer(changes.upserts, many=True)
+        return Response({
+            'upserts': serializer.data,
+            'deletes': changes.deletes,
+            'next_token': changes.token,
+            'has_more': changes.has_more,
+        })
+
+
+class BatchRetrieveMixin:
+    """Adds a `batch` action fetching up to batch_max_ids objects by ?ids=1,2,3 in one query.
+
+    Results keep the requested order, with a not-found marker for missing ids.
+    The response carries an ETag of its content and answers If-None-Match
+    with 304, so clients and HTTP caches can revalidate cheaply.
+    """
+    batch_max_ids = 50
+
+    @action(detail=False, methods=['get'])
+    def batch(self, request):
+        try:
+            ids = list(dict.fromkeys(
+                int(pk) for pk in request.query_params.get('ids', '').split(',') if pk.strip()
+            ))
+        except ValueError:
+            ids = None
+
+        if not ids or len(ids) > self.batch_max_ids:
+            return Response(
+                {'error': f'ids must be a comma-separated list of 1 to {self.batch_max_ids} integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        objects = self.get_queryset().in_bulk(ids)
+        serialized = iter(self.get_serializer([objects[pk] for pk in ids if pk in objects], many=True).data)
+        results = [
+            next(serialized) if pk in objects else {'id': pk, 'error': 'Not found'}
+            for pk in ids
+        ]
+
+        content = json.dumps(results, cls=JSONEncoder, sort_keys=True).encode()
+        etag = '"%s"' % hashlib.md5(content).hexdigest()
+        if etag in [tag.strip() for tag in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response({'results': results})
+
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+        response['Vary'] = 'Authorization'
+        return response
+
+
+class _Projection:
+    """Collects the columns, joins and prefetches a set of serializer fields needs"""
+
+    def __init__(self, model):
+        self.opts = model._meta
+        self.only = {self.opts.pk.name}
+        self.select_related = set()
+        self.whole = set()
+        self.prefetch = set()
+
+    def use(self, path, whole_object=False):
+        """Record a model path such as 'price', 'category__name' or 'items'; False if unknown"""
+        name, _, rest = path.partition('__')
+        try:
+            field = self.opts.get_field(name)
+        except FieldDoesNotExist:
+            return False
+
+        if not field.is_relation:
+            self.only.add(field.name)
+        elif name == getattr(field, 'attname', None) != field.name:
+            # Foreign key column read without the join, e.g. 'category_id'
+            self.only.add(name)
+        elif field.one_to_many or field.many_to_many:
+            self.prefetch.add(name)
+        elif not field.concrete:
+            # Reverse one-to-one, e.g. Product.rating_summary
+            self.select_related.add(name)
+        elif rest or whole_object:
+            self.select_related.add(name)
+            if whole_object:
+                self.whole.add(name)
+            if rest and self._is_column(field.related_model, rest):
+                self.only.add(path)
+            else:
+                self.only.add(name)
+        else:
+            self.only.add(field.attname)
+        return True
+
+    @staticmethod
+    def _is_column(model, name):
+        try:
+            return model._meta.get_field(name).concrete
+        except FieldDoesNotExist:
+            return False
+
+    def apply(self, queryset):
+        queryset = queryset.select_related(None)
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+
+        lookups = [
+            lookup for lookup in queryset._prefetch_related_lookups
+            if (lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup).split('__')[0] in self.prefetch
+        ]
+        # A relation rendered as a whole object must not have its columns narrowed
+        only = [path for path in self.only if path.split('__')[0] not in self.whole or '__' not in path]
+        return queryset.prefetch_related(None).prefetch_related(*lookups).only(*only)
+
+
+def project_queryset(queryset, serializer):
+    """Narrow queryset to the columns and relations the serializer's fields read.
+
+    Falls back to the unchanged queryset when a field reads something that
+    cannot be traced back to the model, such as an undeclared property.
+    """
+    projection = _Projection(queryset.model)
+    dependencies = getattr(serializer.Meta, 'field_dependencies', {})
+
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if name in dependencies:
+            paths = dependencies[name]
+        elif field.source == '*':
+            return queryset
+        else:
+            paths = [field.source.replace('.', '__')]
+
+        whole_object = isinstance(field, BaseSerializer) or name in dependencies
+        if not all(projection.use(path, whole_object) for path in paths):
+            return queryset
+
+    return projection.apply(queryset)
+
+
+class SparseFieldsetMixin:
+    """Lets clients shape read responses with ?fields=, ?omit= and ?expand=.
+
+    The chosen fields are passed to the serializer and pushed down into the
+    queryset as only()/select_related()/prefetch_related(), so columns,
+    joins and prefetches for unrequested fields are never loaded.
+    """
+
+    def get_fieldset_options(self):
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return {}
+
+        options = {}
+        for param in ('fields', 'omit', 'expand'):
+            value = self.request.query_params.get(param)
+            if value:
+                options[param] = [name.strip() for name in value.split(',') if name.strip()]
+        return options
+
+    def get_serializer(self, *args, **kwargs):
+        if issubclass(self.get_serializer_class(), SparseFieldsMixin):
+            for key, value in self.get_fieldset_options().items():
+                kwargs.setdefault(key, value)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        options = self.get_fieldset_options()
+        serializer_class = self.get_serializer_class()
+
+        if options and issubclass(serializer_class, SparseFieldsMixin):
+            serializer = serializer_class(context=self.get_serializer_context(), **options)
+            queryset = project_queryset(queryset, serializer)
+        return queryset
@@ -1,17 +1,25 @@
 from django.db import models
+from django.core.exceptions import ObjectDoesNotExist
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth.models import User
 
+from .fields import MoneyField
+
 # Create your models here.
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
     image = models.ImageField(upload_to='categories/', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "Categories"
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['updated_at', 'id']),
+            models.Index(fields=['created_at']),
+        ]
 
     def __str__(self):
         return self.name
@@ -38,6 +46,10 @@ class Product(models.Model):
         indexes = [
             models.Index(fields=['category', 'is_featured']),
             models.Index(fields=['price']),
+            models.Index(fields=['updated_at', 'id']),
+            models.Index(fields=['-created_at']),
+            models.Index(fields=['category', '-created_at']),
+            models.Index(fields=['is_featured', '-created_at']),
         ]
 
     def __str__(self):
@@ -45,16 +57,39 @@ class Product(models.Model):
 
     @property
     def average_rating(self):
-        reviews = self.reviews.all()
-        if reviews:
-            return sum(review.rating for review in reviews) / len(reviews)
-        return 0
+        try:
+            return self.rating_summary.average
+        except ObjectDoesNotExist:
+            return 0
+
+    @property
+    def reviews_count(self):
+        try:
+            return self.rating_summary.count
+        except ObjectDoesNotExist:
+            return 0
 
     @property
     def in_stock(self):
         """Check if product is in stock"""
         return self.stock > 0
 
+
+class Tombstone(models.Model):
+    """Marker left behind by a deleted catalog object for the change feeds"""
+    model = models.CharField(max_length=100)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['deleted_at', 'id']
+        indexes = [
+            models.Index(fields=['model', 'deleted_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.model} #{self.object_id} deleted"
+
     
 class Customer(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
@@ -68,11 +103,23 @@ class Customer(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at']),
+            models.Index(fields=['full_name']),
+        ]
 
     def __str__(self):
         return self.full_name
 
 
+class OrderHistoryManager(models.Manager):
+    """Order manager whose tiered() result also covers archived orders"""
+
+    def tiered(self, **filters):
+        from .archive import TieredOrderSet
+        return TieredOrderSet(filters)
+
+
 class Order(models.Model):
     """Order model with status tracking"""
     STATUS_CHOICES = [
@@ -81,16 +128,32 @@ class Order(models.Model):
         ('delivered', 'Delivered'),
         ('cancelled', 'Cancelled')
     ]
+    ALLOWED_TRANSITIONS = {
+        'pending': ['shipped', 'cancelled'],
+        'shipped': ['delivered', 'cancelled'],
+        'delivered': [],
+        'cancelled': [],
+    }
 
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
-    total_price = models.FloatField(validators=[MinValueValidator(0.0)])
+    total_price = MoneyField(validators=[MinValueValidator(0)])
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     notes = models.TextField(blank=True, null=True)
 
+    objects = models.Manager()
+    # Live and archived orders together, see shop.archive
+    history = OrderHistoryManager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at']),
+            models.Index(fields=['status', '-created_at']),
+            models.Index(fields=['customer', '-created_at']),
+            models.Index(fields=['total_price']),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} - {self.customer.full_name}"
@@ -100,11 +163,33 @@ class Order(models.Model):
         return sum(item.quantity for item in self.items.all())
 
 
+class OrderStatusHistory(models.Model):
+    """Append-only record of every order status change"""
+    # Rows outlive the order they point to once it is moved to ArchivedOrder
+    order = models.ForeignKey(
+        Order, on_delete=models.DO_NOTHING, db_constraint=False, related_name='status_history'
+    )
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "Order status history"
+        ordering = ['order', 'changed_at']
+        indexes = [
+            models.Index(fields=['order', 'changed_at']),
+        ]
+
+    def __str__(self):
+        return f"Order #{self.order_id}: {self.from_status} -> {self.to_status}"
+
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField(validators=[MinValueValidator(1)])
-    subtotal = models.FloatField(validators=[MinValueValidator(0.0)])
+    subtotal = MoneyField(validators=[MinValueValidator(0)])
 
     class Meta:
         ordering = ['id']
@@ -117,6 +202,49 @@ class OrderItem(models.Model):
         super().save(*args, **kwargs)
 
 
+class ArchivedOrder(models.Model):
+    """Closed order moved out of the live Order table, keeping its id"""
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='archived_orders')
+    total_price = MoneyField(validators=[MinValueValidator(0)])
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    notes = models.TextField(blank=True, null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['customer', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"Archived order #{self.id} - {self.customer.full_name}"
+
+    @property
+    def items_count(self):
+        return sum(item.quantity for item in self.items.all())
+
+    @property
+    def status_history(self):
+        return OrderStatusHistory.objects.filter(order_id=self.id)
+
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    quantity = models.IntegerField(validators=[MinValueValidator(1)])
+    subtotal = MoneyField(validators=[MinValueValidator(0)])
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.quantity}x {self.product.name}"
+
+
 class Review(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='reviews')
@@ -127,6 +255,199 @@ class Review(models.Model):
     class Meta:
         ordering = ['-created_at']
         unique_together = ['product', 'customer']
+        indexes = [
+            models.Index(fields=['-created_at']),
+            models.Index(fields=['product', '-created_at']),
+            models.Index(fields=['customer', '-created_at']),
+            models.Index(fields=['rating', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} - {self.rating} stars by {self.customer.full_name}"
+
+
+class ProductRating(models.Model):
+    """1-5 star histogram of a product's reviews, maintained on review writes"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='rating_summary')
+    stars_1 = models.IntegerField(default=0)
+    stars_2 = models.IntegerField(default=0)
+    stars_3 = models.IntegerField(default=0)
+    stars_4 = models.IntegerField(default=0)
+    stars_5 = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.product_id}: {self.average:.2f} ({self.count} reviews)"
+
+    @property
+    def histogram(self):
+        return {str(stars): getattr(self, f'stars_{stars}') for stars in range(1, 6)}
+
+    @property
+    def count(self):
+        return sum(self.histogram.values())
+
+    @property
+    def average(self):
+        count = self.count
+        if count:
+            return sum(int(stars) * n for stars, n in self.histogram.items()) / count
+        return 0
+
+
+class ProductCooccurrence(models.Model):
+    """Number of orders containing both products; the diagonal holds per-product order counts"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['product', 'other']
+
+    def __str__(self):
+        return f"{self.product_id} & {self.other_id}: {self.count}"
+
+
+class ProductRecommendation(models.Model):
+    """Precomputed top-K "frequently bought together" neighbours of a product"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ['product', 'rank']
+        unique_together = ['product', 'rank']
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.recommended_id} ({self.score:.3f})"
+
+
+class ProductSales(models.Model):
+    """All-time units sold per product, maintained from order writes"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='sales')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    total_sold = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Product sales"
+        indexes = [
+            models.Index(fields=['-total_sold']),
+            models.Index(fields=['category', '-total_sold']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.total_sold} sold"
+
+
+class ProductSalesBucket(models.Model):
+    """Units sold per product per hour, summed over rolling bestseller windows"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    bucket = models.DateTimeField()
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['product', 'bucket']
+        indexes = [
+            models.Index(fields=['bucket']),
+            models.Index(fields=['category', 'bucket']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.bucket:%Y-%m-%d %H:00}: {self.quantity}"
+
+
+class ProductSalesWindow(models.Model):
+    """Units sold per product over one rolling window, rolled up from the hourly buckets"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    window = models.CharField(max_length=8)
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['product', 'window']
+        indexes = [
+            models.Index(fields=['window', '-quantity']),
+            models.Index(fields=['window', 'category', '-quantity']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} over {self.window}: {self.quantity}"
+
+
+class LeaderboardWindow(models.Model):
+    """Start of the oldest hourly bucket still counted in a window's rolled-up totals"""
+    window = models.CharField(max_length=8, primary_key=True)
+    expired_before = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.window} from {self.expired_before:%Y-%m-%d %H:00}"
+
+
+class ProductPopularity(models.Model):
+    """Buffered view counter and forward-decayed popularity score per product"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='popularity')
+    views = models.BigIntegerField(default=0)
+    score = models.FloatField(default=0.0)
+    # Decay epoch whose landmark the score is relative to, see shop.popularity
+    epoch = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Product popularity"
+        indexes = [
+            models.Index(fields=['-score']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.views} views"
+
+
+class MediaBlob(models.Model):
+    """A content-addressed media file and the number of model fields pointing at it"""
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64)
+    size = models.BigIntegerField()
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+
+class AutocompleteTerm(models.Model):
+    """Normalized prefix key of a customer or product, for indexed autocomplete"""
+    kind = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    field = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'key']),
+            models.Index(fields=['kind', 'object_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id}: {self.key}"
+
+
+class AutocompleteTrigram(models.Model):
+    """Three-character fragment of a customer or product, for typo-tolerant autocomplete"""
+    kind = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'trigram']),
+            models.Index(fields=['kind', 'object_id']),
+        ]
 
     def __str__(self):
-        return f"{self.product.name} - {self.rating} stars by {self.customer.full_name}"
\ No newline at end of file
+        return f"{self.kind} #{self.object_id}: {self.trigram}"
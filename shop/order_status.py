@@ -0,0 +1,68 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, OrderStatusHistory
+from . import events, leaderboard, recommendations
+
+
+def bulk_transition(order_ids, new_status, user=None):
+    """Move many orders to new_status with set-based writes.
+
+    Orders are grouped by their current status so the whole batch costs one
+    locked read, one UPDATE per source status and one bulk INSERT of history
+    rows. Returns (updated_ids, failures) where failures is a list of
+    {'id', 'error'} entries for orders that were missing or not allowed to
+    make the transition.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    changed_by = user if user is not None and user.is_authenticated else None
+    updated = []
+    failures = []
+    by_status = defaultdict(list)
+
+    with transaction.atomic():
+        current = {}
+        customers = {}
+        for order_id, old_status, customer_id in (
+            Order.objects.select_for_update()
+            .filter(pk__in=order_ids)
+            .values_list('id', 'status', 'customer_id')
+        ):
+            current[order_id] = old_status
+            customers[order_id] = customer_id
+
+        for order_id in order_ids:
+            old_status = current.get(order_id)
+            if old_status is None:
+                failures.append({'id': order_id, 'error': 'Not found'})
+            elif new_status not in Order.ALLOWED_TRANSITIONS[old_status]:
+                failures.append({
+                    'id': order_id,
+                    'error': f"Cannot change status from '{old_status}' to '{new_status}'",
+                })
+            else:
+                by_status[old_status].append(order_id)
+                updated.append(order_id)
+
+        now = timezone.now()
+        history = []
+        for old_status, ids in by_status.items():
+            Order.objects.filter(pk__in=ids).update(status=new_status, updated_at=now)
+            history.extend(
+                OrderStatusHistory(
+                    order_id=order_id, from_status=old_status,
+                    to_status=new_status, changed_by=changed_by
+                )
+                for order_id in ids
+            )
+        OrderStatusHistory.objects.bulk_create(history, batch_size=1000)
+
+        for old_status, ids in by_status.items():
+            leaderboard.status_changed(ids, old_status, new_status)
+            recommendations.status_changed(ids, old_status, new_status)
+            for order_id in ids:
+                events.status_changed(order_id, customers[order_id], old_status, new_status)
+
+    return updated, failures
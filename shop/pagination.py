@@ -0,0 +1,105 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def estimated_row_count(model, using='default'):
+    """Return the planner/collection estimate of a table's size, or None"""
+    connection = connections[using]
+    table = model._meta.db_table
+
+    try:
+        if connection.vendor == 'djongo':
+            connection.ensure_connection()
+            return connection.connection[table].estimated_document_count()
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+            elif connection.vendor == 'mysql':
+                cursor.execute(
+                    'SELECT table_rows FROM information_schema.tables '
+                    'WHERE table_schema = DATABASE() AND table_name = %s', [table]
+                )
+            else:
+                return None
+            row = cursor.fetchone()
+    except Exception:
+        return None
+
+    return int(row[0]) if row and row[0] is not None else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that uses the table size estimate for unfiltered querysets.
+
+    Counting every row of a multi-million row table on each page load is the
+    slowest part of an admin changelist. When no filter is applied the
+    estimate is close enough; small tables and filtered querysets are still
+    counted exactly.
+    """
+    estimate_threshold = 10000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimated_row_count(self.object_list.model, self.object_list.db)
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return estimate
+        return super().count
+
+
+class ReviewPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class TieredCursorPagination(BasePagination):
+    """Keyset pagination over an archive.TieredOrderSet.
+
+    The cursor encodes the (created_at, id) of the last order on the page, so
+    every page reads at most page_size + 1 rows per tier however deep it is.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 12
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, orders, request, view=None):
+        self.request = request
+        page = orders.page(self.page_size + 1, self.decode_cursor(request))
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.next_position = (page[-1].created_at, page[-1].id) if self.has_next else None
+        return page
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created_at, order_id = urlsafe_b64decode(encoded.encode()).decode().split('|')
+            return datetime.fromisoformat(created_at), int(order_id)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        created_at, order_id = position
+        return urlsafe_b64encode(f'{created_at.isoformat()}|{order_id}'.encode()).decode()
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
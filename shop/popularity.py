@@ -0,0 +1,213 @@
+"""Buffered product view counts and a forward-decayed popularity score.
+
+Product retrieves call record_view(), which only adds to an in-memory buffer
+in the current worker and never touches the database. A background thread in
+each worker flushes the buffer every FLUSH_INTERVAL seconds, or as soon as
+MAX_PENDING views are waiting, and the buffer is flushed once more when the
+process exits. A flush runs one F() update per distinct view count, covering
+every already counted product with that count, plus a bulk insert of the
+missing ProductPopularity rows. A worker that crashes loses at most what it
+had buffered.
+
+The score uses forward decay: a view at time t adds 2 ** ((t - landmark) /
+HALF_LIFE), so stored scores never have to be decayed one by one and ordering
+by the raw score ranks products by their decayed popularity. Views are
+weighted at the time of the flush that writes them, which is off by at most
+one flush interval. To keep the weights in float range the landmark moves
+forward every EPOCH_HALF_LIVES half-lives. The first flush of a new epoch
+rescales the stored scores to it, and each row records the epoch its score
+is relative to.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Product, ProductPopularity
+
+FLUSH_INTERVAL = getattr(settings, 'PRODUCT_VIEWS_FLUSH_INTERVAL', 30)
+MAX_PENDING = getattr(settings, 'PRODUCT_VIEWS_MAX_PENDING', 1000)
+HALF_LIFE = getattr(settings, 'PRODUCT_POPULARITY_HALF_LIFE_HOURS', 24 * 7) * 3600
+EPOCH_HALF_LIVES = 64
+EPOCH_SECONDS = HALF_LIFE * EPOCH_HALF_LIVES
+
+
+def current_epoch(moment=None):
+    moment = time.time() if moment is None else moment
+    return int(moment // EPOCH_SECONDS)
+
+
+def view_weight(epoch, moment=None):
+    """Score contributed by one view at moment (a unix timestamp, default now)"""
+    moment = time.time() if moment is None else moment
+    return 2.0 ** ((moment - epoch * EPOCH_SECONDS) / HALF_LIFE)
+
+
+def rescale_factor(from_epoch, to_epoch):
+    """Multiplier moving a score from one epoch's landmark to a later one's"""
+    return 2.0 ** (-(to_epoch - from_epoch) * EPOCH_HALF_LIVES)
+
+
+def decayed_score(popularity, moment=None):
+    """A row's score expressed in views as of moment, decayed by age"""
+    return popularity.score / view_weight(popularity.epoch, moment)
+
+
+class ViewBuffer:
+    """Per-worker {product_id: views} waiting to be written by a flusher thread"""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.pending = Counter()
+        self.count = 0
+        self.flusher = None
+
+    def _ensure_flusher(self):
+        """Start the flusher thread; call with the lock held"""
+        # Forked workers inherit the buffer but not the parent's thread
+        if self.flusher is None or self.flusher.pid != os.getpid() or not self.flusher.is_alive():
+            self.flusher = Flusher(self)
+            self.flusher.start()
+
+    def add(self, product_id, views=1):
+        with self.lock:
+            self.pending[product_id] += views
+            self.count += views
+            self._ensure_flusher()
+            if self.count >= self.max_pending:
+                self.wake.set()
+
+    def drain(self):
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+            self.count = 0
+            return pending
+
+    def flush(self):
+        """Write the buffered counts, returning how many products were updated"""
+        pending = self.drain()
+        if not pending:
+            return 0
+        try:
+            write(pending)
+        except DatabaseError:
+            # Keep the counts for the next flush rather than dropping them
+            with self.lock:
+                self.pending.update(pending)
+                self.count += sum(pending.values())
+            raise
+        return len(pending)
+
+
+class Flusher(threading.Thread):
+    """Flush a ViewBuffer every flush_interval seconds or when it fills up"""
+
+    def __init__(self, buffer):
+        super().__init__(name='product-views-flusher', daemon=True)
+        self.buffer = buffer
+        self.pid = os.getpid()
+
+    def run(self):
+        while True:
+            self.buffer.wake.wait(self.buffer.flush_interval)
+            self.buffer.wake.clear()
+            try:
+                self.buffer.flush()
+            except DatabaseError:
+                # The counts went back into the buffer for the next flush
+                pass
+            finally:
+                close_old_connections()
+
+
+def rebase(epoch):
+    """Rescale rows from earlier epochs to epoch, once per epoch they are in"""
+    stale = set(ProductPopularity.objects.filter(epoch__lt=epoch).values_list('epoch', flat=True))
+    for old in stale:
+        ProductPopularity.objects.filter(epoch=old).update(
+            score=F('score') * rescale_factor(old, epoch), epoch=epoch,
+        )
+
+
+def _update_existing(product_ids, pending, weight):
+    """One update per distinct view count, each covering every product with that count"""
+    by_views = defaultdict(list)
+    for product_id in product_ids:
+        by_views[pending[product_id]].append(product_id)
+    now = timezone.now()
+    for views, ids in sorted(by_views.items()):
+        ProductPopularity.objects.filter(product_id__in=sorted(ids)).update(
+            views=F('views') + views, score=F('score') + views * weight, updated_at=now,
+        )
+
+
+def _create(product_ids, pending, weight, epoch):
+    ProductPopularity.objects.bulk_create([
+        ProductPopularity(
+            product_id=product_id, views=pending[product_id],
+            score=pending[product_id] * weight, epoch=epoch,
+        )
+        for product_id in product_ids
+    ])
+
+
+def write(pending, moment=None):
+    """Apply {product_id: views}, weighting the views as of moment (default now)"""
+    moment = time.time() if moment is None else moment
+    epoch = current_epoch(moment)
+    weight = view_weight(epoch, moment)
+    with transaction.atomic():
+        rebase(epoch)
+        existing = set(
+            ProductPopularity.objects.filter(product_id__in=pending).values_list('product_id', flat=True)
+        )
+        _update_existing(existing, pending, weight)
+
+        # Views of products deleted since they were recorded are dropped
+        missing = set(
+            Product.objects.filter(id__in=set(pending) - existing).values_list('id', flat=True)
+        )
+        if not missing:
+            return
+        try:
+            with transaction.atomic():
+                _create(missing, pending, weight, epoch)
+        except IntegrityError:
+            # Another worker created some of these rows since the lookup
+            created = set(
+                ProductPopularity.objects.filter(product_id__in=missing).values_list('product_id', flat=True)
+            )
+            _update_existing(created, pending, weight)
+            _create(missing - created, pending, weight, epoch)
+
+
+buffer = ViewBuffer()
+
+
+def record_view(product_id):
+    try:
+        buffer.add(product_id)
+    except Exception:
+        # Counting a view must never fail the read that triggered it
+        pass
+
+
+def flush():
+    return buffer.flush()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        buffer.flush()
+    except Exception:
+        pass
@@ -0,0 +1,254 @@
+"""On-demand sampling profiler for single requests.
+
+A request is profiled only when it carries a valid signed ``X-Profile`` header
+(see make_token) or when a staff user adds ``?profile=1``. Any other request
+goes straight through the middleware with nothing attached. While profiling,
+a sampler thread records the request thread's stack every few milliseconds,
+and a database execute wrapper tags samples taken inside a query with the
+statement and table. Profiles are stored in PROFILE_DIR as collapsed stacks
+(one ``frame;frame;frame count`` line per distinct stack) next to a small JSON
+metadata file. Both speedscope and flamegraph.pl read the collapsed format.
+"""
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from django.utils import timezone
+from django.utils.text import slugify
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+HEADER = 'HTTP_X_PROFILE'
+QUERY_FLAG = 'profile'
+SALT = 'shop.profiling'
+TOKEN_MAX_AGE = getattr(settings, 'PROFILE_TOKEN_MAX_AGE', 60 * 60)
+INTERVAL = getattr(settings, 'PROFILE_INTERVAL', 0.005)
+MAX_DEPTH = 128
+
+SQL_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+["`]?(\w+)', re.IGNORECASE)
+
+
+def profile_dir():
+    return Path(getattr(settings, 'PROFILE_DIR', settings.BASE_DIR / 'profiles'))
+
+
+def make_token():
+    """Return a value for the X-Profile header, valid for TOKEN_MAX_AGE seconds"""
+    return signing.TimestampSigner(salt=SALT).sign('profile')
+
+
+def has_valid_token(value):
+    try:
+        return signing.TimestampSigner(salt=SALT).unsign(value, max_age=TOKEN_MAX_AGE) == 'profile'
+    except signing.BadSignature:
+        return False
+
+
+def _is_staff(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    # API clients authenticate with a JWT, which DRF only resolves in the view
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return bool(result and result[0].is_staff)
+
+
+def is_requested(request):
+    if HEADER in request.META:
+        return has_valid_token(request.META[HEADER])
+    if QUERY_FLAG in request.GET and _is_staff(request):
+        # Strip the flag so views and admin filters never see it
+        request.GET = request.GET.copy()
+        del request.GET[QUERY_FLAG]
+        request.META['QUERY_STRING'] = request.GET.urlencode()
+        return True
+    return False
+
+
+def frame_label(code):
+    module = code.co_filename
+    if module.startswith('<'):
+        return f'{module}:{code.co_name}'
+    for path in sorted(sys.path, key=len, reverse=True):
+        if path and module.startswith(path):
+            module = module[len(path):].lstrip('/\\')
+            break
+    module = module.rsplit('.', 1)[0].replace('/', '.').replace('\\', '.')
+    return f'{module}:{getattr(code, "co_qualname", code.co_name)}'
+
+
+def sql_label(sql):
+    sql = str(sql).lstrip()
+    verb = sql.split(None, 1)[0].upper() if sql else 'SQL'
+    match = SQL_TABLE.search(sql)
+    return f'[sql] {verb} {match.group(1)}' if match else f'[sql] {verb}'
+
+
+class Sampler(threading.Thread):
+    """Periodically capture the stack of one thread as collapsed frames"""
+
+    def __init__(self, thread_id, interval=INTERVAL):
+        super().__init__(name='request-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.sql = None
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own_file = __file__
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                if frame.f_code.co_filename != own_file:
+                    stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            if self.sql is not None:
+                stack.append(self.sql)
+            if stack:
+                self.stacks[';'.join(stack)] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        self.sql = sql_label(sql)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.sql_count += 1
+            self.sql = None
+
+
+def save(sampler, request, response, duration):
+    """Write the collapsed stacks and metadata, returning the profile name"""
+    started = timezone.now()
+    path_slug = slugify(request.path.replace('/', '-')) or 'root'
+    name = f'{started:%Y%m%d-%H%M%S-%f}-{request.method.lower()}-{path_slug}'
+
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / f'{name}.collapsed', 'w') as out:
+        for stack, count in sampler.stacks.most_common():
+            out.write(f'{stack} {count}\n')
+    with open(directory / f'{name}.json', 'w') as out:
+        json.dump({
+            'name': name,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'created_at': started.isoformat(),
+            'duration_ms': round(duration * 1000, 2),
+            'interval_ms': sampler.interval * 1000,
+            'samples': sum(sampler.stacks.values()),
+            'sql_count': sampler.sql_count,
+            'sql_ms': round(sampler.sql_time * 1000, 2),
+        }, out, indent=2)
+    return name
+
+
+def list_profiles():
+    """Return the metadata of stored profiles, newest first"""
+    profiles = []
+    for meta in sorted(profile_dir().glob('*.json'), reverse=True):
+        with open(meta) as handle:
+            profiles.append(json.load(handle))
+    return profiles
+
+
+def load_stacks(name):
+    """Return [(frames, count)] for a stored profile"""
+    stacks = []
+    with open(profile_dir() / f'{name}.collapsed') as handle:
+        for line in handle:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            stacks.append((stack.split(';'), int(count)))
+    return stacks
+
+
+def to_speedscope(name):
+    """Convert a stored profile to the speedscope file format"""
+    with open(profile_dir() / f'{name}.json') as handle:
+        meta = json.load(handle)
+
+    frames = []
+    index = {}
+    samples = []
+    weights = []
+    for stack, count in load_stacks(name):
+        sample = []
+        for label in stack:
+            if label not in index:
+                index[label] = len(frames)
+                frames.append({'name': label})
+            sample.append(index[label])
+        samples.append(sample)
+        weights.append(count * meta['interval_ms'])
+
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': f"{meta['method']} {meta['path']}",
+        'exporter': 'shop.profiling',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': f"{meta['method']} {meta['path']}",
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights,
+        }],
+    }
+
+
+def self_time(name, limit=20):
+    """Return [(frame, samples)] ranked by samples spent in the frame itself"""
+    totals = Counter()
+    for stack, count in load_stacks(name):
+        totals[stack[-1]] += count
+    return totals.most_common(limit)
+
+
+class ProfilingMiddleware:
+    """Profile the request when is_requested() says so, otherwise do nothing"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_requested(request):
+            return self.get_response(request)
+
+        sampler = Sampler(threading.get_ident())
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(sampler.execute_wrapper))
+            sampler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                sampler.stop()
+        duration = time.perf_counter() - start
+
+        response['X-Profile-Id'] = save(sampler, request, response, duration)
+        return response
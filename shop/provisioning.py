@@ -0,0 +1,206 @@
+"""Bulk creation of users and their customers from migrated account records.
+
+Each record is a dict with an ``email`` and optionally ``username``,
+``password_hash`` (any hash Django's hashers recognise, stored as-is),
+``first_name``, ``last_name``, ``full_name``, ``phone``, ``address``, ``city``
+and ``country``. Emails are stored lowercase. Records are processed in
+chunks: one lookup for emails (compared case-insensitively) and usernames
+already taken, one bulk insert of users, one query to read back their ids
+(djongo does not return primary keys from bulk_create) and one bulk insert
+of customers. Rows that cannot be created are reported, not raised.
+
+djongo has no transactions, so a bulk insert that fails part way may have
+written some of its rows. Instead of relying on a rollback, the rows that
+were written are read back after each insert, users left without a customer
+are deleted, and only the rest of the chunk is reported as conflicting.
+"""
+from itertools import islice
+
+from django.contrib.auth.base_user import BaseUserManager
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .models import Customer
+from . import autocomplete
+
+CHUNK_SIZE = 1000
+# Emails per case-insensitive lookup, each one an OR'ed iexact condition
+EMAIL_LOOKUP_SIZE = 100
+CUSTOMER_FIELDS = ['phone', 'address', 'city', 'country']
+
+
+def _chunks(records, size):
+    iterator = enumerate(records, start=1)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class InvalidRecord(dict):
+    """Placeholder for an input row that could not be parsed, rejected with its error"""
+
+    def __init__(self, error):
+        super().__init__()
+        self.error = error
+
+
+def _clean(record):
+    """Return (user_kwargs, customer_kwargs) for a record or raise ValueError"""
+    if isinstance(record, InvalidRecord):
+        raise ValueError(record.error)
+    if not isinstance(record, dict):
+        raise ValueError('Record is not an object')
+    email = BaseUserManager.normalize_email(str(record.get('email') or '').strip()).lower()
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise ValueError('Invalid email')
+
+    password = record.get('password_hash') or None
+    if password is None:
+        password = make_password(None)
+    else:
+        try:
+            identify_hasher(password)
+        except ValueError:
+            raise ValueError('Unrecognised password hash')
+
+    first_name = str(record.get('first_name') or '').strip()
+    last_name = str(record.get('last_name') or '').strip()
+    user = {
+        'username': str(record.get('username') or email).strip(),
+        'email': email,
+        'password': password,
+        'first_name': first_name,
+        'last_name': last_name,
+    }
+    customer = {
+        'email': email,
+        'full_name': str(record.get('full_name') or f'{first_name} {last_name}'.strip() or email.split('@')[0]),
+        **{field: str(record.get(field) or '') for field in CUSTOMER_FIELDS},
+    }
+
+    for model, values in ((User, user), (Customer, customer)):
+        for field, value in values.items():
+            max_length = model._meta.get_field(field).max_length
+            if max_length and len(value) > max_length:
+                raise ValueError(f'{field} is longer than {max_length} characters')
+    return user, customer
+
+
+def _taken_emails(emails):
+    """The lowercase emails of users or customers matching emails in any case"""
+    emails = sorted(emails)
+    taken = set()
+    for start in range(0, len(emails), EMAIL_LOOKUP_SIZE):
+        matches = Q()
+        for email in emails[start:start + EMAIL_LOOKUP_SIZE]:
+            matches |= Q(email__iexact=email)
+        for model in (User, Customer):
+            taken.update(email.lower() for email in model.objects.filter(matches).values_list('email', flat=True))
+    return taken
+
+
+def _written_users(rows):
+    """{username: id} of the users of rows that are in the database.
+
+    Every row has its own password hash (make_password salts unusable ones
+    too), so matching on it tells these rows apart from a concurrent writer's.
+    """
+    passwords = {user['username']: user['password'] for _, user, _ in rows}
+    return {
+        username: user_id
+        for username, password, user_id in User.objects.filter(username__in=passwords)
+        .values_list('username', 'password', 'id')
+        if passwords[username] == password
+    }
+
+
+def _create_chunk(rows):
+    """Insert one chunk of cleaned rows, returning (customers created, rows not written)"""
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create([User(**user) for _, user, _ in rows])
+    except IntegrityError:
+        pass
+    user_ids = _written_users(rows)
+
+    written = [(row, user, customer) for row, user, customer in rows if user['username'] in user_ids]
+    try:
+        with transaction.atomic():
+            Customer.objects.bulk_create([
+                Customer(user_id=user_ids[user['username']], **customer)
+                for _, user, customer in written
+            ])
+    except IntegrityError:
+        pass
+    customers = {customer.user_id: customer for customer in Customer.objects.filter(user_id__in=user_ids.values())}
+
+    orphans = [user_id for user_id in user_ids.values() if user_id not in customers]
+    if orphans:
+        User.objects.filter(id__in=orphans).delete()
+    failed = [row for row in rows if user_ids.get(row[1]['username']) not in customers]
+    return list(customers.values()), failed
+
+
+def provision(records, chunk_size=CHUNK_SIZE):
+    """Create accounts from an iterable of records, chunk by chunk.
+
+    Yields (created, conflicts) per chunk, where conflicts is a list of
+    {'row', 'email', 'error'} with 1-based row numbers. Emails are compared
+    case-insensitively, against the database and earlier rows of the stream.
+    """
+    seen_emails = set()
+    seen_usernames = set()
+
+    for chunk in _chunks(records, chunk_size):
+        conflicts = []
+        rows = []
+        for row, record in chunk:
+            try:
+                user, customer = _clean(record)
+            except ValueError as exc:
+                email = record.get('email') if isinstance(record, dict) else None
+                conflicts.append({'row': row, 'email': email, 'error': str(exc)})
+                continue
+            rows.append((row, user, customer))
+
+        # Emails are stored lowercase, but older rows may not be
+        taken_emails = _taken_emails({user['email'] for _, user, _ in rows})
+        taken_usernames = set(
+            User.objects.filter(username__in=[user['username'] for _, user, _ in rows])
+            .values_list('username', flat=True)
+        )
+
+        accepted = []
+        for row, user, customer in rows:
+            if user['email'] in taken_emails or user['email'] in seen_emails:
+                error = 'Email already exists'
+            elif user['username'] in taken_usernames or user['username'] in seen_usernames:
+                error = 'Username already exists'
+            else:
+                seen_emails.add(user['email'])
+                seen_usernames.add(user['username'])
+                accepted.append((row, user, customer))
+                continue
+            conflicts.append({'row': row, 'email': user['email'], 'error': error})
+
+        created = 0
+        if accepted:
+            customers, failed = _create_chunk(accepted)
+            # Someone else wrote these accounts since the lookup
+            conflicts.extend(
+                {'row': row, 'email': user['email'], 'error': 'Conflicting concurrent write, retry'}
+                for row, user, _ in failed
+            )
+            autocomplete.index_new_objects('customer', customers)
+            created = len(customers)
+
+        conflicts.sort(key=lambda conflict: conflict['row'])
+        yield created, conflicts
@@ -0,0 +1,224 @@
+""""Frequently bought together" recommendations from order co-occurrence.
+
+The co-occurrence matrix is kept sparse: one ProductCooccurrence row per pair
+of products that were ever ordered together, plus a diagonal row holding the
+number of orders per product. Scores are cosine similarities
+``count(a, b) / sqrt(count(a) * count(b))`` and the top-K neighbours of every
+product are stored in ProductRecommendation so a lookup is a single indexed
+query.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+from itertools import combinations, groupby
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import ArchivedOrderItem, OrderItem, Product, ProductCooccurrence, ProductRecommendation
+from . import archive
+
+TOP_K = getattr(settings, 'RECOMMENDATIONS_TOP_K', 10)
+
+
+def build_cooccurrence(baskets):
+    """Accumulate per-product and per-pair order counts from product id baskets"""
+    item_counts = Counter()
+    pair_counts = defaultdict(Counter)
+
+    for basket in baskets:
+        products = sorted(set(basket))
+        item_counts.update(products)
+        for a, b in combinations(products, 2):
+            pair_counts[a][b] += 1
+            pair_counts[b][a] += 1
+
+    return item_counts, pair_counts
+
+
+def top_neighbours(product_id, row, item_counts, k=TOP_K):
+    """Return the k best (other_id, score) pairs for one row of the matrix"""
+    norm = item_counts[product_id]
+    if not norm:
+        return []
+
+    scored = (
+        (count / math.sqrt(norm * item_counts[other]), count, other)
+        for other, count in row.items()
+        if other != product_id and item_counts[other]
+    )
+    best = heapq.nlargest(k, scored, key=lambda entry: (entry[0], entry[1], -entry[2]))
+    return [(other, score) for score, count, other in best]
+
+
+def _recommendation_rows(product_id, neighbours):
+    return [
+        ProductRecommendation(
+            product_id=product_id, recommended_id=other, score=score, rank=rank
+        )
+        for rank, (other, score) in enumerate(neighbours)
+    ]
+
+
+def _order_baskets():
+    items = archive.order_items('order_id', 'product_id')
+    for order_id, rows in groupby(items, key=lambda row: row[0]):
+        yield [product_id for _, product_id in rows]
+
+
+def rebuild(k=TOP_K, batch_size=1000):
+    """Recompute the whole matrix and every neighbour list from order history"""
+    item_counts, pair_counts = build_cooccurrence(_order_baskets())
+
+    cooccurrences = [
+        ProductCooccurrence(product_id=product_id, other_id=product_id, count=count)
+        for product_id, count in item_counts.items()
+    ]
+    recommendations = []
+    for product_id, row in pair_counts.items():
+        cooccurrences.extend(
+            ProductCooccurrence(product_id=product_id, other_id=other, count=count)
+            for other, count in row.items()
+        )
+        recommendations.extend(
+            _recommendation_rows(product_id, top_neighbours(product_id, row, item_counts, k))
+        )
+
+    with transaction.atomic():
+        ProductCooccurrence.objects.all().delete()
+        ProductRecommendation.objects.all().delete()
+        ProductCooccurrence.objects.bulk_create(cooccurrences, batch_size=batch_size)
+        ProductRecommendation.objects.bulk_create(recommendations, batch_size=batch_size)
+
+    return {
+        'products': len(item_counts),
+        'pairs': len(cooccurrences) - len(item_counts),
+        'recommendations': len(recommendations),
+    }
+
+
+def refresh(product_ids, k=TOP_K):
+    """Recompute the stored neighbour lists of the given products"""
+    product_ids = set(product_ids)
+
+    with transaction.atomic():
+        # Serialises refreshes of the same products, whose lists share (product, rank) keys
+        list(Product.objects.select_for_update().filter(id__in=product_ids).order_by('id').values_list('id'))
+
+        rows = defaultdict(dict)
+        item_counts = Counter()
+        for product_id, other, count in ProductCooccurrence.objects.filter(
+            product_id__in=product_ids
+        ).values_list('product_id', 'other_id', 'count'):
+            rows[product_id][other] = count
+            if product_id == other:
+                item_counts[product_id] = count
+
+        others = {other for row in rows.values() for other in row} - set(item_counts)
+        item_counts.update(dict(
+            ProductCooccurrence.objects.filter(product_id__in=others, other_id=F('product_id'))
+            .values_list('product_id', 'count')
+        ))
+
+        recommendations = []
+        for product_id in product_ids:
+            recommendations.extend(
+                _recommendation_rows(product_id, top_neighbours(product_id, rows[product_id], item_counts, k))
+            )
+
+        ProductRecommendation.objects.filter(product_id__in=product_ids).delete()
+        ProductRecommendation.objects.bulk_create(recommendations)
+
+
+def _refresh_after_commit(product_ids):
+    try:
+        refresh(product_ids)
+    except IntegrityError:
+        # A backend without row locks raced another refresh; the lists catch
+        # up on the next order or rebuild, the order itself is already saved
+        pass
+
+
+def _apply_deltas(deltas):
+    """Add {(product, other): delta} to the pair counts.
+
+    Existing rows get one F() update per distinct delta. Missing pairs are
+    created one by one, falling back to an update when a concurrent order
+    created the row first, so no backend needs a rollback to stay exact.
+    Negative deltas on missing pairs are ignored.
+    """
+    product_ids = {a for a, _ in deltas}
+    existing = {
+        (product_id, other): pk
+        for pk, product_id, other in ProductCooccurrence.objects.filter(
+            product_id__in=product_ids, other_id__in=product_ids
+        ).values_list('pk', 'product_id', 'other_id')
+    }
+
+    by_delta = defaultdict(list)
+    for pair, delta in deltas.items():
+        if pair in existing and delta:
+            by_delta[delta].append(existing[pair])
+    for delta, pks in by_delta.items():
+        ProductCooccurrence.objects.filter(pk__in=pks).update(count=F('count') + delta)
+
+    for (a, b), delta in deltas.items():
+        if (a, b) in existing or delta <= 0:
+            continue
+        try:
+            with transaction.atomic():
+                ProductCooccurrence.objects.create(product_id=a, other_id=b, count=delta)
+        except IntegrityError:
+            ProductCooccurrence.objects.filter(product_id=a, other_id=b).update(count=F('count') + delta)
+
+
+def record_orders(order_ids, sign=1, archived=False):
+    """Add (sign=1) or remove (sign=-1) the baskets of the given orders.
+
+    Only the products in the orders are re-ranked, after the transaction
+    commits; lists of other products drift slightly until the next full
+    rebuild.
+    """
+    item_model = ArchivedOrderItem if archived else OrderItem
+    items = (
+        item_model.objects.filter(order_id__in=order_ids)
+        .order_by('order_id').values_list('order_id', 'product_id')
+    )
+    deltas = Counter()
+    for _, rows in groupby(items, key=lambda row: row[0]):
+        basket = {product_id for _, product_id in rows}
+        for a in basket:
+            for b in basket:
+                deltas[(a, b)] += sign
+    if not deltas:
+        return
+
+    _apply_deltas(deltas)
+    product_ids = {a for a, _ in deltas}
+    transaction.on_commit(lambda: _refresh_after_commit(product_ids))
+
+
+def record_order(order):
+    """Add one new order to the matrix; cancelled orders are not counted, as in rebuild()"""
+    if order.status != 'cancelled':
+        record_orders([order.id])
+
+
+def status_changed(order_ids, old_status, new_status):
+    """Keep the pair counts in sync when orders move into or out of cancelled"""
+    if old_status != 'cancelled' and new_status == 'cancelled':
+        record_orders(order_ids, sign=-1)
+    elif old_status == 'cancelled' and new_status != 'cancelled':
+        record_orders(order_ids, sign=1)
+
+
+def recommended_products(product_id, limit=TOP_K):
+    """Return the stored neighbours of a product as Product instances, best first"""
+    ids = list(
+        ProductRecommendation.objects.filter(product_id=product_id)
+        .order_by('rank')
+        .values_list('recommended_id', flat=True)[:limit]
+    )
+    products = Product.objects.select_related('rating_summary').in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
@@ -1,20 +1,83 @@
+from collections import Counter
+
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Category, Product, Customer, Order, OrderItem, Review
+from django.db.models import Count
+from .models import ArchivedOrder, Category, Product, Customer, Order, OrderItem, Review
+from . import catalog, events, leaderboard, recommendations
+from .loaders import BatchLoadingListSerializer, BatchLoadingMixin
+
+class MoneyAmountField(serializers.DecimalField):
+    """Decimal amount rendered as a JSON number, matching the previous float output"""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('max_digits', 14)
+        kwargs.setdefault('decimal_places', 2)
+        kwargs.setdefault('coerce_to_string', False)
+        super().__init__(**kwargs)
+
+
+class SparseFieldsMixin:
+    """Serializer mixin honouring `fields`, `omit` and `expand` keyword arguments.
+
+    `expand` swaps a related id for the nested serializer declared in
+    Meta.expandable_fields. Meta.field_dependencies lists the model fields
+    behind computed fields so views can narrow their queries to match.
+    """
 
-class CategorySerializer(serializers.ModelSerializer):
+    def __init__(self, *args, fields=None, omit=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+
+        for name in expand or ():
+            if name in expandable:
+                serializer_class, options = expandable[name]
+                self.fields[name] = serializer_class(**options)
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+        for name in omit or ():
+            self.fields.pop(name, None)
+
+
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     products_count  = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
-        fields = ['id', 'name', 'description', 'image', 'created_at', 'products_count']
-        read_only_fields = ['created_at']
+        fields = ['id', 'name', 'description', 'image', 'created_at', 'updated_at', 'products_count']
+        read_only_fields = ['created_at', 'updated_at']
 
     def get_products_count(self, obj):
-        return obj.products.count()
+        cached = catalog.get_category(obj.id)
+        return cached._products_count if cached is not None else obj.products.count()
 
-class ProductListSerializer(serializers.ModelSerializer):
-    category_name = serializers.CharField(source='category.name', read_only=True)
+
+class CachedCategorySerializer(CategorySerializer):
+    """Nested category read from the in-process snapshot instead of a join"""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'category_id')
+        super().__init__(**kwargs)
+
+    def to_representation(self, category_id):
+        category = catalog.get_category(category_id)
+        return super().to_representation(category) if category is not None else None
+
+
+class CachedCategoryNameField(serializers.CharField):
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'category_id')
+        kwargs.setdefault('read_only', True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, category_id):
+        category = catalog.get_category(category_id)
+        return category.name if category is not None else None
+
+
+class ProductListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    category_name = CachedCategoryNameField()
     average_rating = serializers.FloatField(read_only=True)
     in_stock = serializers.BooleanField(read_only=True)
 
@@ -24,16 +87,23 @@ class ProductListSerializer(serializers.ModelSerializer):
             'id', 'name', 'price', 'stock', 'image', 'category', 'category_name', 'is_featured', 'average_rating', 'in_stock', 'material', 'color', 'dimensions'
         ]
         read_only_fields = ['created_at', 'updated_at']
+        expandable_fields = {
+            'category': (CachedCategorySerializer, {'read_only': True}),
+        }
+        field_dependencies = {
+            'average_rating': ['rating_summary'],
+            'in_stock': ['stock'],
+        }
 
     def get_reviews_count(self, obj):
         return obj.reviews.count()
 
-class ProductDetailSerializer(serializers.ModelSerializer):
-    category = CategorySerializer(read_only=True)
+class ProductDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    category = CachedCategorySerializer(read_only=True)
     category_id = serializers.IntegerField(write_only=True)
     average_rating = serializers.FloatField(read_only=True)
     in_stock = serializers.BooleanField(read_only=True)
-    reviews_count = serializers.SerializerMethodField()
+    reviews_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Product
@@ -44,12 +114,14 @@ class ProductDetailSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at']
-
-    def get_reviews_count(self, obj):
-        return obj.reviews.count()
+        field_dependencies = {
+            'average_rating': ['rating_summary'],
+            'in_stock': ['stock'],
+            'reviews_count': ['rating_summary'],
+        }
 
         
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsMixin, BatchLoadingMixin, serializers.ModelSerializer):
     orders_count = serializers.SerializerMethodField()
 
     class Meta:
@@ -58,23 +130,45 @@ class CustomerSerializer(serializers.ModelSerializer):
             'id', 'full_name', 'email', 'phone', 'address', 'city', 'country', 'created_at', 'orders_count'
         ]
         read_only_fields = ['created_at']
+        list_serializer_class = BatchLoadingListSerializer
+
+    def batch_load(self, instances):
+        """Count live and archived orders for every customer on the page in two queries"""
+        if 'orders_count' not in self.fields:
+            return
+        pending = [obj for obj in instances if not hasattr(obj, '_orders_count')]
+        if not pending:
+            return
+        ids = [obj.pk for obj in pending]
+        counts = Counter()
+        for model in (Order, ArchivedOrder):
+            rows = model.objects.filter(customer_id__in=ids).values('customer_id').annotate(n=Count('id'))
+            for row in rows.order_by():
+                counts[row['customer_id']] += row['n']
+        for obj in pending:
+            obj._orders_count = counts[obj.pk]
 
     def get_orders_count(self, obj):
-        return obj.orders.count()
+        if hasattr(obj, '_orders_count'):
+            return obj._orders_count
+        return obj.orders.count() + obj.archived_orders.count()
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(BatchLoadingMixin, serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_image = serializers.ImageField(source='product.Image', read_only=True)
+    subtotal = MoneyAmountField(read_only=True)
 
     class Meta:
         model = OrderItem
         fields = ['id', 'product', 'product_name', 'product_image', 'quantity', 'subtotal']
         read_only_fields = ['subtotal']
+        list_serializer_class = BatchLoadingListSerializer
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, BatchLoadingMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     customer_name = serializers.CharField(source='customer.full_name', read_only=True)
     items_count = serializers.IntegerField(read_only=True)
+    total_price = MoneyAmountField(min_value=0)
 
     class Meta:
         model = Order
@@ -82,9 +176,17 @@ class OrderSerializer(serializers.ModelSerializer):
             'id', 'customer', 'customer_name', 'total_price', 'status', 'created_at', 'updated_at', 'notes', 'items', 'items_count'
         ]
         read_only_fields = ['created_at', 'updated_at']
+        list_serializer_class = BatchLoadingListSerializer
+        expandable_fields = {
+            'customer': (CustomerSerializer, {'read_only': True}),
+        }
+        field_dependencies = {
+            'items_count': ['items'],
+        }
 
 class OrderCreateSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
+    total_price = MoneyAmountField(min_value=0)
 
     class Meta:
         model = Order
@@ -97,9 +199,13 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         for item_data in items_data:
             OrderItem.objects.create(order=order, **item_data)
 
+        if order.status != 'cancelled':
+            leaderboard.record_orders([order.id])
+        recommendations.record_order(order)
+        events.order_created(order)
         return order
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsMixin, BatchLoadingMixin, serializers.ModelSerializer):
     customer_name = serializers.CharField(source='customer.full_name', read_only=True)
     product_name = serializers.CharField(source='product.name', read_only=True)
 
@@ -109,6 +215,11 @@ class ReviewSerializer(serializers.ModelSerializer):
             'id', 'product', 'product_name', 'customer', 'customer_name', 'rating', 'comment', 'created_at'
         ]
         read_only_fields = ['created_at']
+        list_serializer_class = BatchLoadingListSerializer
+        expandable_fields = {
+            'product': (ProductListSerializer, {'read_only': True}),
+            'customer': (CustomerSerializer, {'read_only': True}),
+        }
 
     def validated_rating(self, value):
         if value < 1 or value > 5:
@@ -137,6 +248,6 @@ class AnalyticsSerializer(serializers.Serializer):
     total_products = serializers.IntegerField()
     total_orders = serializers.IntegerField()
     total_customers = serializers.IntegerField()
-    total_revenue = serializers.FloatField()
+    total_revenue = MoneyAmountField()
     top_selling_products = ProductListSerializer(many=True)
     recent_orders = OrderSerializer(many=True)
\ No newline at end of file
@@ -0,0 +1,115 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Category, Customer, Product, ProductRating, Review, Tombstone
+from . import autocomplete, catalog
+from .storage import adjust_refs
+
+# Model image fields whose files are reference counted in MediaBlob
+MEDIA_FIELDS = {Product: ['image'], Category: ['image']}
+
+
+def _adjust_rating(product_id, rating, delta):
+    field = f'stars_{rating}'
+    updated = ProductRating.objects.filter(product_id=product_id).update(**{field: F(field) + delta})
+    if not updated and delta > 0:
+        ProductRating.objects.create(product_id=product_id, **{field: delta})
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    """Keep the stored rating so an edit can move the review between histogram bars"""
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = (
+            Review.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    if previous == (instance.product_id, instance.rating):
+        return
+    if previous is not None:
+        _adjust_rating(*previous, -1)
+    _adjust_rating(instance.product_id, instance.rating, 1)
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_delete(sender, instance, **kwargs):
+    _adjust_rating(instance.product_id, instance.rating, -1)
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Product)
+def record_tombstone(sender, instance, **kwargs):
+    """Let delta-sync clients know the object is gone"""
+    Tombstone.objects.create(model=sender._meta.label_lower, object_id=instance.pk)
+
+
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Product)
+def remember_previous_media(sender, instance, **kwargs):
+    fields = MEDIA_FIELDS[sender]
+    instance._previous_media = []
+    if instance.pk:
+        row = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+        instance._previous_media = [name for name in row or () if name]
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Product)
+def update_media_refs_on_save(sender, instance, **kwargs):
+    current = [getattr(instance, field).name for field in MEDIA_FIELDS[sender]]
+    current = [name for name in current if name]
+    previous = getattr(instance, '_previous_media', [])
+
+    adjust_refs([name for name in current if name not in previous], 1)
+    adjust_refs([name for name in previous if name not in current], -1)
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Product)
+def update_media_refs_on_delete(sender, instance, **kwargs):
+    adjust_refs([getattr(instance, field).name for field in MEDIA_FIELDS[sender]], -1)
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Product)
+def update_autocomplete_index(sender, instance, **kwargs):
+    autocomplete.index_object(sender._meta.model_name, instance)
+
+
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Product)
+def remove_from_autocomplete_index(sender, instance, **kwargs):
+    autocomplete.remove_object(sender._meta.model_name, instance.pk)
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_category(sender, instance, update_fields=None, **kwargs):
+    """Keep the stored category so a save can tell whether category counts changed"""
+    instance._previous_category_id = None
+    if instance.pk and (update_fields is None or 'category' in update_fields):
+        instance._previous_category_id = (
+            Product.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Product)
+def invalidate_category_snapshot(sender, **kwargs):
+    catalog.invalidate()
+
+
+@receiver(post_save, sender=Product)
+def invalidate_category_counts(sender, instance, created, update_fields=None, **kwargs):
+    """The snapshot only holds product counts, so only a new product or a category move stales it"""
+    if created:
+        catalog.invalidate()
+    elif update_fields is None or 'category' in update_fields:
+        if getattr(instance, '_previous_category_id', None) != instance.category_id:
+            catalog.invalidate()
@@ -0,0 +1,78 @@
+"""Content-addressed file storage for uploaded media.
+
+Files are named after the SHA-256 of their bytes, e.g.
+``products/3f/3f9a...c1.jpg``, so identical uploads share one file and a
+given URL always serves the same content. Every stored file has a MediaBlob
+row whose ref_count is maintained by model signals; files nothing points at
+any more are removed by the gc_media command.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+
+from .models import MediaBlob
+
+CONTENT_ADDRESSED_NAME = re.compile(r'(^|/)([0-9a-f]{2})/\2[0-9a-f]{62}(\.[A-Za-z0-9]+)?$')
+
+
+def is_content_addressed(name):
+    return bool(name and CONTENT_ADDRESSED_NAME.search(name))
+
+
+def adjust_refs(names, delta):
+    """Add delta to the reference count of every tracked blob in names"""
+    names = [name for name in names if is_content_addressed(name)]
+    if names:
+        MediaBlob.objects.filter(name__in=names).update(ref_count=F('ref_count') + delta)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files by content hash and deduplicates them"""
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save, and an existing
+        # file with that name already holds exactly the same bytes.
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        upload_dir = self.path(directory)
+        os.makedirs(upload_dir, exist_ok=True)
+
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=upload_dir, suffix='.upload')
+        try:
+            # Hash and spool to disk in a single pass over the upload
+            with os.fdopen(fd, 'wb') as temp_file:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+                    size += len(chunk)
+
+            sha256 = digest.hexdigest()
+            name = posixpath.join(directory, sha256[:2], sha256 + extension)
+            full_path = self.path(name)
+
+            if os.path.exists(full_path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temp_path, self.file_permissions_mode)
+                os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        MediaBlob.objects.get_or_create(name=name, defaults={'sha256': sha256, 'size': size})
+        return name
@@ -0,0 +1,89 @@
+"""Delta sync for catalog resources keyed on updated_at.
+
+A sync token is an opaque cursor over two streams of a model: rows ordered by
+(updated_at, id) and tombstones ordered by (deleted_at, id). Clients start
+without a token, apply the returned upserts and deletes, and resume from the
+returned token until has_more is false.
+"""
+import base64
+import json
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Tombstone
+
+# Rows newer than this may still belong to uncommitted transactions
+SETTLE_DELAY = timedelta(seconds=2)
+
+ChangeSet = namedtuple('ChangeSet', ['upserts', 'deletes', 'token', 'has_more'])
+
+
+def encode_token(cursor):
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+
+def decode_token(token):
+    """Parse a sync token into {'u': (datetime, id), 'd': (datetime, id)}, raising ValueError"""
+    if not token:
+        return {}
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return {
+            stream: (parse_datetime(moment), int(pk))
+            for stream, (moment, pk) in raw.items() if stream in ('u', 'd')
+        }
+    except (TypeError, ValueError, AttributeError):
+        raise ValueError('Invalid sync token')
+
+
+def _after(queryset, field, position):
+    if position is None:
+        return queryset
+    moment, pk = position
+    if moment is None:
+        raise ValueError('Invalid sync token')
+    return queryset.filter(Q(**{f'{field}__gt': moment}) | Q(**{field: moment, 'pk__gt': pk}))
+
+
+def _page(queryset, limit):
+    rows = list(queryset[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def changes_since(queryset, token=None, limit=500):
+    """Return the rows upserted and the ids deleted after token"""
+    cursor = decode_token(token)
+    settled = timezone.now() - SETTLE_DELAY
+
+    upserts, more_upserts = _page(
+        _after(queryset, 'updated_at', cursor.get('u'))
+        .filter(updated_at__lte=settled)
+        .order_by('updated_at', 'pk'),
+        limit,
+    )
+    tombstones, more_deletes = _page(
+        _after(
+            Tombstone.objects.filter(model=queryset.model._meta.label_lower),
+            'deleted_at', cursor.get('d'),
+        )
+        .filter(deleted_at__lte=settled)
+        .order_by('deleted_at', 'pk'),
+        limit,
+    )
+
+    if upserts:
+        cursor['u'] = (upserts[-1].updated_at, upserts[-1].pk)
+    if tombstones:
+        cursor['d'] = (tombstones[-1].deleted_at, tombstones[-1].pk)
+
+    next_token = encode_token({
+        stream: [moment.isoformat(), pk] for stream, (moment, pk) in cursor.items()
+    })
+    return ChangeSet(
+        upserts, [tombstone.object_id for tombstone in tombstones],
+        next_token, more_upserts or more_deletes,
+    )
@@ -1,3 +1,169 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import provisioning
+from .archive import archive_batch
+from .fields import from_minor_units, to_minor_units
+from .models import ArchivedOrder, Customer, Order, OrderStatusHistory
+
+
+def make_customer(username='buyer', email='buyer@example.com'):
+    user = User.objects.create_user(username=username, email=email, password='x')
+    return Customer.objects.create(user=user, full_name='Buyer', email=email)
+
+
+class MoneyFieldTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer()
+        self.order = Order.objects.create(customer=self.customer, total_price=Decimal('59.97'))
+
+    def test_round_trip_keeps_cents(self):
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, Decimal('59.97'))
+        self.assertEqual(to_minor_units(0.1 + 0.2), 30)
+        self.assertEqual(from_minor_units(1999), Decimal('19.99'))
+
+    def test_float_range_lookups_are_not_rounded(self):
+        orders = Order.objects.all()
+        self.assertTrue(orders.filter(total_price__gte=59.97).exists())
+        self.assertTrue(orders.filter(total_price__gte=59.5).exists())
+        self.assertTrue(orders.filter(total_price__lte=59.97).exists())
+        self.assertFalse(orders.filter(total_price__lt=59.97).exists())
+        self.assertFalse(orders.filter(total_price__gt=59.97).exists())
+        self.assertTrue(orders.filter(total_price=59.97).exists())
+
+    def test_decimal_and_str_lookups(self):
+        self.assertTrue(Order.objects.filter(total_price__gte=Decimal('59.97')).exists())
+        self.assertFalse(Order.objects.filter(total_price__gte='59.98').exists())
+
+
+class OrderStatusTransitionTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer()
+        self.order = Order.objects.create(customer=self.customer, total_price=Decimal('10.00'))
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+
+    def test_allowed_transition_writes_history(self):
+        response = self.client.patch(f'/api/orders/{self.order.id}/update_status/', {'status': 'shipped'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'shipped')
+        history = OrderStatusHistory.objects.get(order_id=self.order.id)
+        self.assertEqual((history.from_status, history.to_status), ('pending', 'shipped'))
+
+    def test_skipped_transition_is_rejected(self):
+        for url in (f'/api/orders/{self.order.id}/update_status/', f'/api/orders/{self.order.id}/'):
+            response = self.client.patch(url, {'status': 'delivered'})
+            self.assertEqual(response.status_code, 400)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'pending')
+        self.assertFalse(OrderStatusHistory.objects.exists())
+
+    def test_bulk_update_requires_ids_or_filter(self):
+        for body in ({'status': 'shipped'}, {'status': 'shipped', 'filter': {}},
+                     {'status': 'shipped', 'filter': {'status': ''}}):
+            response = self.client.post('/api/orders/bulk_update_status/', body, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'pending')
+
+    def test_bulk_update_reports_failed_orders(self):
+        done = Order.objects.create(customer=self.customer, total_price=Decimal('5.00'), status='delivered')
+        response = self.client.post(
+            '/api/orders/bulk_update_status/',
+            {'status': 'shipped', 'ids': [self.order.id, done.id]}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], [self.order.id])
+        self.assertEqual([failure['id'] for failure in response.data['failed']], [done.id])
+
+
+class TieredOrderPagingTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer()
+        now = timezone.now()
+        for days in range(7):
+            order = Order.objects.create(customer=self.customer, total_price=Decimal('1.00'), status='delivered')
+            # Two orders share a timestamp so the id has to break the tie
+            Order.objects.filter(pk=order.pk).update(created_at=now - timedelta(days=min(days, 5)))
+        archive_batch(list(Order.objects.order_by('id').values_list('id', flat=True)[::2]))
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'x'))
+
+    def expected_ids(self):
+        rows = [
+            (created_at, pk)
+            for model in (Order, ArchivedOrder)
+            for pk, created_at in model.objects.values_list('id', 'created_at')
+        ]
+        return [pk for _, pk in sorted(rows, reverse=True)]
+
+    def test_page_continues_after_position(self):
+        self.assertTrue(ArchivedOrder.objects.exists())
+        orders = Order.history.tiered(customer=self.customer)
+        seen = []
+        position = None
+        while True:
+            page = orders.page(3, position)
+            if not page:
+                break
+            seen += [order.id for order in page]
+            position = (page[-1].created_at, page[-1].id)
+        self.assertEqual(seen, self.expected_ids())
+
+    def test_cursor_links_walk_both_tiers(self):
+        url = f'/api/customers/{self.customer.id}/orders/'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [order['id'] for order in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, self.expected_ids())
+
+    def test_invalid_cursor(self):
+        response = self.client.get(f'/api/customers/{self.customer.id}/orders/?cursor=nope')
+        self.assertEqual(response.status_code, 404)
+
+
+class ProvisioningTests(TestCase):
+    def test_conflicts_are_reported_per_row(self):
+        make_customer('existing', 'Taken@Example.com')
+        records = [
+            {'email': 'taken@example.com'},
+            {'email': 'New@Example.com', 'username': 'new'},
+            {'email': 'new@example.COM', 'username': 'other'},
+            {'email': 'not an email'},
+            provisioning.InvalidRecord('Invalid JSON'),
+            {'email': 'second@example.com', 'username': 'new'},
+        ]
+        results = list(provisioning.provision(records))
+        self.assertEqual(sum(created for created, _ in results), 1)
+        conflicts = [conflict for _, chunk in results for conflict in chunk]
+        self.assertEqual(
+            [(conflict['row'], conflict['error']) for conflict in conflicts],
+            [
+                (1, 'Email already exists'),
+                (3, 'Email already exists'),
+                (4, 'Invalid email'),
+                (5, 'Invalid JSON'),
+                (6, 'Username already exists'),
+            ],
+        )
+        customer = Customer.objects.get(email='new@example.com')
+        self.assertEqual(customer.user.username, 'new')
 
-# Create your tests here.
+    def test_rows_written_elsewhere_are_not_counted(self):
+        make_customer('racer', 'race@example.com')
+        # As if a concurrent import wrote the email after the lookup
+        with mock.patch.object(provisioning, '_taken_emails', return_value=set()):
+            ((created, conflicts),) = provisioning.provision([{'email': 'race@example.com', 'username': 'late'}])
+        self.assertEqual(created, 0)
+        self.assertEqual([conflict['row'] for conflict in conflicts], [1])
+        self.assertFalse(User.objects.filter(username='late').exists())
@@ -14,5 +14,7 @@ urlpatterns = [
     path('', include(router.urls)),
     path('auth/register/', views.register_user, name='register'),
     path('analytics/', views.analytics_dashboard, name='analytics'),
+    path('autocomplete/customers/', views.autocomplete_customers, name='autocomplete-customers'),
+    path('autocomplete/products/', views.autocomplete_products, name='autocomplete-products'),
 ]
 
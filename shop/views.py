@@ -1,11 +1,14 @@
 from django.shortcuts import render
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny, IsAuthenticatedOrReadOnly
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAuthenticatedOrReadOnly, IsAdminUser
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Count, Sum, Q, F
+from django.db.models import Count, Q, F
 from django.contrib.auth import authenticate
+from django.conf import settings
+from django.views.static import serve
 
 from .models import Category, Product, Customer, Order, OrderItem, Review
 from .serializers import (
@@ -14,77 +17,207 @@ from .serializers import (
     OrderItemSerializer, ReviewSerializer, UserRegistrationSerializer,
     AnalyticsSerializer
 )
-from .filters import ProductFilter
+from .filters import AliasOrderingFilter, ProductFilter
+from .mixins import BatchRetrieveMixin, ChangeFeedMixin, SparseFieldsetMixin
+from .pagination import ReviewPagination, TieredCursorPagination
+from .storage import is_content_addressed
+from .order_status import bulk_transition
+from . import autocomplete, catalog, leaderboard, popularity, provisioning, recommendations
 
 # Create your views here.
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(SparseFieldsetMixin, ChangeFeedMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'description']
     ordering_fields = ['name', 'created_at']
+    snapshot_list_params = {'page', 'fields', 'omit', 'expand'}
 
-class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.select_related('category').all()
+    def list(self, request, *args, **kwargs):
+        # Plain listings are served from the in-process category snapshot
+        if set(request.query_params) - self.snapshot_list_params:
+            return super().list(request, *args, **kwargs)
+
+        categories = catalog.snapshot().categories
+        page = self.paginate_queryset(categories)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(categories, many=True)
+        return Response(serializer.data)
+
+class ProductViewSet(SparseFieldsetMixin, ChangeFeedMixin, BatchRetrieveMixin, viewsets.ModelViewSet):
+    queryset = Product.objects.select_related('rating_summary').all()
     permission_classes = [IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, AliasOrderingFilter]
     filterset_class = ProductFilter
     search_fields = ['price', 'created_at', 'name', 'stock']
     ordering = ['-created_at']
+    ordering_aliases = {
+        # Products never viewed have no popularity row and sort last
+        'trending': [F('popularity__score').desc(nulls_last=True), '-created_at'],
+    }
 
     def get_serializer_class(self):
-        if self.action == 'list':
+        if self.action in ('list', 'featured'):
             return ProductListSerializer
         return ProductDetailSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        # Buffered in this worker and written in batches, see shop.popularity
+        popularity.record_view(instance.id)
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
     @action(detail=False, methods=['get'])
     def featured(self, request):
-        featured_products = self.queryset.filter(is_featured=True)
+        featured_products = self.get_queryset().filter(is_featured=True)
         page = self.paginate_queryset(featured_products)
 
         if page is not None:
-            serializer = ProductListSerializer(page, many=True)
+            serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
 
-        serializer = ProductListSerializer(featured_products, many=True)
+        serializer = self.get_serializer(featured_products, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def bestsellers(self, request):
+        window = request.query_params.get('window', 'all')
+        category = request.query_params.get('category')
+
+        if window not in leaderboard.WINDOWS:
+            return Response(
+                {'error': f"Invalid window, choose one of: {', '.join(leaderboard.WINDOWS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            limit = int(request.query_params.get('limit', 10))
+            category_id = int(category) if category else None
+        except ValueError:
+            return Response(
+                {'error': 'limit and category must be integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if limit < 1:
+            return Response(
+                {'error': 'limit must be at least 1'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        products = leaderboard.bestseller_products(window, category_id, limit)
+        serializer = ProductListSerializer(products, many=True)
         return Response(serializer.data)
 
     @action(detail=True, methods=['get'])
     def reviews(self, request, pk=None):
         product = self.get_object()
-        reviews = product.reviews.all()
-        serializer = ReviewSerializer(reviews, many=True)
+        ordering = request.query_params.get('ordering', '-created_at')
+
+        if ordering not in ('created_at', '-created_at', 'rating', '-rating'):
+            return Response(
+                {'error': 'Invalid ordering'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        reviews = product.reviews.select_related('customer').order_by(ordering, '-id')
+        paginator = ReviewPagination()
+        page = paginator.paginate_queryset(reviews, request, view=self)
+        serializer = ReviewSerializer(page, many=True)
+
+        response = paginator.get_paginated_response(serializer.data)
+        response.data['average_rating'] = product.average_rating
+        response.data['rating_histogram'] = (
+            product.rating_summary.histogram if product.reviews_count
+            else {str(stars): 0 for stars in range(1, 6)}
+        )
+        return response
+
+    @action(detail=True, methods=['get'])
+    def recommendations(self, request, pk=None):
+        product = self.get_object()
+        products = recommendations.recommended_products(product.id)
+        serializer = ProductListSerializer(products, many=True)
         return Response(serializer.data)
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['full_name', 'email', 'phone', 'city', 'country']
     ordering_fields = ['full_name', 'created_at']
+    provision_max_accounts = 10000
 
     @action(detail=True, methods=['get'])
     def orders(self, request, pk=None):
+        """Full order history of the customer, live and archived"""
         customer = self.get_object()
-        orders = customer.orders.all()
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+        paginator = TieredCursorPagination()
+        page = paginator.paginate_queryset(Order.history.tiered(customer=customer), request, view=self)
+        serializer = OrderSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def provision(self, request):
+        """Bulk-create users and customers from migrated account records"""
+        records = request.data.get('accounts') if isinstance(request.data, dict) else request.data
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            return Response(
+                {'error': "Provide 'accounts' as a list of objects"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(records) > self.provision_max_accounts:
+            return Response(
+                {'error': f'At most {self.provision_max_accounts} accounts can be imported per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.select_related('customer').prefetch_related('items').all()
+        created = 0
+        conflicts = []
+        for chunk_created, chunk_conflicts in provisioning.provision(records):
+            created += chunk_created
+            conflicts.extend(chunk_conflicts)
+        return Response({'created': created, 'conflicts': conflicts})
+
+class OrderViewSet(SparseFieldsetMixin, BatchRetrieveMixin, viewsets.ModelViewSet):
+    queryset = Order.objects.select_related('customer').prefetch_related('items__product').all()
     permission_classes = [IsAuthenticatedOrReadOnly]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['status', 'customer']
     ordering_fields = ['created_at', 'total_price']
     ordering = ['-created_at']
+    bulk_max_orders = 10000
 
     def get_serializer_class(self):
         if self.action == 'create':
             return OrderCreateSerializer
         return OrderSerializer
 
+    def perform_update(self, serializer):
+        # Status changes go through the same transition rules and history as update_status
+        order = serializer.instance
+        new_status = serializer.validated_data.pop('status', order.status)
+        if new_status != order.status and new_status not in Order.ALLOWED_TRANSITIONS[order.status]:
+            raise ValidationError(
+                {'status': [f"Cannot change status from '{order.status}' to '{new_status}'"]}
+            )
+        serializer.save()
+        if new_status != order.status:
+            bulk_transition([order.id], new_status, self.request.user)
+            order.refresh_from_db(fields=['status', 'updated_at'])
+
+    def perform_destroy(self, instance):
+        # Remove the items from the counters while they still exist
+        if instance.status != 'cancelled':
+            leaderboard.record_orders([instance.id], sign=-1)
+            recommendations.record_orders([instance.id], sign=-1)
+        instance.delete()
+
     @action(detail=True, methods=['patch'])
     def update_status(self, request, pk=None):
         order = self.get_object()
@@ -96,12 +229,64 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        order.status = new_status
-        order.save()
+        if new_status != order.status:
+            _, failed = bulk_transition([order.id], new_status, request.user)
+            if failed:
+                return Response({'error': failed[0]['error']}, status=status.HTTP_400_BAD_REQUEST)
+            order.refresh_from_db(fields=['status', 'updated_at'])
         serializer = OrderSerializer(order)
         return Response(serializer.data)
 
-class ReviewViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def bulk_update_status(self, request):
+        """Change the status of many orders, selected by id list or by filter"""
+        new_status = request.data.get('status')
+        ids = request.data.get('ids')
+        order_filter = request.data.get('filter')
+
+        if new_status not in dict(Order.STATUS_CHOICES):
+            return Response(
+                {'error': 'Invalid status'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if ids is not None:
+            if not isinstance(ids, list) or not all(
+                isinstance(pk, int) and not isinstance(pk, bool) for pk in ids
+            ):
+                return Response(
+                    {'error': 'ids must be a list of integers'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        elif (
+            isinstance(order_filter, dict) and order_filter
+            and set(order_filter) <= set(self.filterset_fields)
+            and all(value not in (None, '') for value in order_filter.values())
+        ):
+            # Same filterset as ?status=&customer= on the list, so values are validated
+            queryset = Order.objects.all()
+            filterset = DjangoFilterBackend().get_filterset_class(self, queryset)(
+                data=order_filter, queryset=queryset, request=request
+            )
+            if not filterset.is_valid():
+                return Response({'error': filterset.errors}, status=status.HTTP_400_BAD_REQUEST)
+            ids = list(filterset.qs.values_list('id', flat=True)[:self.bulk_max_orders + 1])
+        else:
+            return Response(
+                {'error': f"Provide 'ids' or a non-empty 'filter' on {', '.join(self.filterset_fields)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if len(ids) > self.bulk_max_orders:
+            return Response(
+                {'error': f'At most {self.bulk_max_orders} orders can be updated per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        updated, failed = bulk_transition(ids, new_status, request.user)
+        return Response({'status': new_status, 'updated': updated, 'failed': failed})
+
+class ReviewViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Review.objects.select_related('product', 'customer').all()
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
@@ -147,18 +332,15 @@ def register_user(request):
 def analytics_dashboard(request):
     # Total Counts
     total_products = Product.objects.count()
-    total_orders = Order.objects.count()
+    all_orders = Order.history.tiered()
+    total_orders = all_orders.count()
     total_customers = Customer.objects.count()
 
-    # Total revenue
-    total_revenue = Order.objects.aggregate(
-        total = Sum('total_price')
-    )['total'] or 0
+    # Total revenue, archived orders included
+    total_revenue = all_orders.sum('total_price')
 
     # Top 5 selling products
-    top_products = Product.objects.annotate(
-        total_sold = Sum('orderitem__quantity')
-    ).order_by('-total_sold')[:5]
+    top_products = leaderboard.bestseller_products('all', limit=5)
 
     # Recent orders
     recent_orders = Order.objects.all()[:10]
@@ -174,6 +356,31 @@ def analytics_dashboard(request):
     return Response(data)
 
 
+def _autocomplete(request, kind):
+    try:
+        limit = min(int(request.query_params.get('limit', 8)), autocomplete.MAX_LIMIT)
+    except ValueError:
+        return Response(
+            {'error': 'limit must be an integer'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response(autocomplete.suggest(kind, request.query_params.get('q', ''), max(limit, 1)))
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def autocomplete_customers(request):
+    """Ranked customer suggestions by name, email or phone prefix"""
+    return _autocomplete(request, 'customer')
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def autocomplete_products(request):
+    """Ranked product suggestions by name prefix"""
+    return _autocomplete(request, 'product')
+
+
 @api_view(['GET'])
 def api_overview(request):
     """API overview and available endpoints"""
@@ -186,32 +393,56 @@ def api_overview(request):
         },
         'Categories': {
             'List/Create': '/api/categories/',
-            'Detail': '/api/categories/{id}/'
+            'Detail': '/api/categories/{id}/',
+            'Changes': '/api/categories/changes/?since={token}',
         },
         'Products': {
             'list/Create': '/api/products/',
             'Details': '/api/products/{id}/',
+            'Batch': '/api/products/batch/?ids=1,2,3',
+            'Changes': '/api/products/changes/?since={token}',
             "Featured": '/api/products/featured/',
+            'Trending': '/api/products/?ordering=trending',
+            'Bestsellers': '/api/products/bestsellers/?window=24h|7d|30d|all&category={id}',
             'Product Reviews': '/api/products/{id}/reviews/',
+            'Recommendations': '/api/products/{id}/recommendations/',
         },
         'Customers': {
             'List/Create': '/api/customers/',
             'Detail': '/api/customers/{id}/',
             'Customer Orders': '/api/customers/{id}/orders/',
+            'Provision': '/api/customers/provision/',
         },
         'Orders': {
             'List/Create': '/api/orders/',
             'Detail': '/api/orders/{id}/',
+            'Batch': '/api/orders/batch/?ids=1,2,3',
             'Update Status': '/api/orders/{id}/update_status/',
+            'Bulk Update Status': '/api/orders/bulk_update_status/',
         },
         'Reviews': {
             'List/Create': '/api/reviews/',
             'Detail': '/api/reviews/{id}/',
         },
+        'Autocomplete': {
+            'Customers': '/api/autocomplete/customers/?q={text}',
+            'Products': '/api/autocomplete/products/?q={text}',
+        },
+        'Events': {
+            'Order events (SSE, ASGI only)': '/api/events/orders/?token={access}&order={id}',
+        },
         'Analytics': '/api/analytics/',
         'Documentation': {
             'Swagger': '/api/docs/',
             'ReDoc': '/api/redoc/',
         }
     }
-    return Response(routes)
\ No newline at end of file
+    return Response(routes)
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """Development media server that marks content-addressed files as immutable"""
+    response = serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    if is_content_addressed(path):
+        response['Cache-Control'] = f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable'
+    return response